@@ -28,15 +28,21 @@ CONFIG = {
     "bot_qq": "2130212584",  # 机器人QQ号，请修改为你的机器人QQ号
 }
 
-# 设置WebSocket URI和机器人QQ号
-config.set_ws_uri(CONFIG["ws_uri"])
-config.set_bot_uin(CONFIG["bot_qq"])  # 设置机器人QQ号
-config.set_token("")  # 如果有token，请设置
 
-# 初始化机器人客户端
-bot = BotClient()
+def main():
+    # 设置WebSocket URI和机器人QQ号
+    config.set_ws_uri(CONFIG["ws_uri"])
+    config.set_bot_uin(CONFIG["bot_qq"])  # 设置机器人QQ号
+    config.set_token("")  # 如果有token，请设置
+
+    # 初始化机器人客户端
+    bot = BotClient()
 
-if __name__ == "__main__":
     # 运行机器人，自动加载plugins目录下的所有插件
     # asyncio.run(bot.run(reload=True)) 
-    asyncio.run(bot.run())
\ No newline at end of file
+    asyncio.run(bot.run())
+
+
+# 只在直接运行时启动机器人：插件用 spawn 方式启动的子进程（如日志归档）会重新导入本模块
+if __name__ == "__main__":
+    main()
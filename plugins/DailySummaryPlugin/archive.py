@@ -0,0 +1,208 @@
+"""旧消息日志的压缩归档
+
+已经结束的日志（早于 archive_after_days 天）按月合并到 <群号>/<年-月>.jsonl.gz：
+每天的记录切成若干块，每块单独压缩成一个 gzip 成员依次追加，整个文件仍是合法的 gzip，可以直接 zcat。
+<年-月>.blocks.json 记录每块的日期、时间范围、偏移和长度，读取时只解压需要的块。
+归档时去掉每条记录中可以由时间戳还原的 formatted_time。
+
+压缩在进程池中进行，每个 (群, 月) 一个任务，同一个归档文件不会被并发写入。
+"""
+import os
+import gzip
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .log_index import index_path
+from .records import MessageRecord
+
+ARCHIVE_SUFFIX = ".jsonl.gz"
+BLOCKS_SUFFIX = ".blocks.json"
+
+
+def archive_path(group_dir: str, month: str) -> str:
+    return os.path.join(group_dir, f"{month}{ARCHIVE_SUFFIX}")
+
+
+def blocks_path(group_dir: str, month: str) -> str:
+    return os.path.join(group_dir, f"{month}{BLOCKS_SUFFIX}")
+
+
+def load_blocks(group_dir: str, month: str) -> List[Dict]:
+    """读取归档的块索引，没有归档时返回空列表"""
+    try:
+        with open(blocks_path(group_dir, month), "r", encoding="utf-8") as f:
+            return json.load(f)["blocks"]
+    except FileNotFoundError:
+        return []
+
+
+def _save_blocks(group_dir: str, month: str, blocks: List[Dict]):
+    path = blocks_path(group_dir, month)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"blocks": blocks}, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _read_day(log_path: str) -> List[Dict]:
+    records = []
+    with open(log_path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            record.pop("formatted_time", None)
+            records.append(record)
+    return records
+
+
+def compact_month(group_dir: str, month: str, dates: List[str], block_records: int = 2048,
+                  level: int = 6) -> Tuple[int, int, int]:
+    """把一个群某月的若干天日志追加到月归档中，成功后删除原日志（在进程池中执行）
+
+    先追加数据并 fsync，再原子替换块索引，最后删除日志；任何一步中断都不会丢数据，
+    重跑时已在索引中的日期只删除日志，不会重复归档。
+
+    Returns:
+        (归档的天数, 原日志字节数, 压缩后字节数)
+    """
+    blocks = load_blocks(group_dir, month)
+    archived_dates = {block["date"] for block in blocks}
+    path = archive_path(group_dir, month)
+    days = raw_bytes = compressed_bytes = 0
+    done: List[str] = []
+    with open(path, "ab") as f:
+        offset = f.seek(0, os.SEEK_END)
+        for date in sorted(dates):
+            log_path = os.path.join(group_dir, f"{date}.jsonl")
+            if date in archived_dates:
+                done.append(log_path)
+                continue
+            records = _read_day(log_path)
+            raw_bytes += os.path.getsize(log_path)
+            for start in range(0, len(records), block_records):
+                chunk = records[start:start + block_records]
+                payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in chunk)
+                data = gzip.compress(payload.encode("utf-8"), compresslevel=level, mtime=0)
+                f.write(data)
+                blocks.append({
+                    "date": date,
+                    "first": chunk[0]["timestamp"],
+                    "last": chunk[-1]["timestamp"],
+                    "offset": offset,
+                    "length": len(data),
+                    "count": len(chunk),
+                })
+                offset += len(data)
+                compressed_bytes += len(data)
+            done.append(log_path)
+            days += 1
+        f.flush()
+        os.fsync(f.fileno())
+    _save_blocks(group_dir, month, blocks)
+    for log_path in done:
+        for stale in (log_path, index_path(log_path)):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+    return days, raw_bytes, compressed_bytes
+
+
+def read_archived(group_dir: str, date: str, after_timestamp: Optional[float] = None) -> List[MessageRecord]:
+    """从月归档中读取某天时间戳大于 after_timestamp 的记录，只解压相关的块"""
+    month = date[:7]
+    blocks = [block for block in load_blocks(group_dir, month)
+              if block["date"] == date and (after_timestamp is None or block["last"] > after_timestamp)]
+    if not blocks:
+        return []
+    messages = []
+    with open(archive_path(group_dir, month), "rb") as f:
+        for block in blocks:
+            f.seek(block["offset"])
+            payload = gzip.decompress(f.read(block["length"]))
+            for line in payload.splitlines():
+                record = MessageRecord.from_dict(json.loads(line))
+                if after_timestamp is None or record.timestamp > after_timestamp:
+                    messages.append(record)
+    return messages
+
+
+def find_closed_logs(storage_dir: str, archive_after_days: int) -> Dict[Tuple[str, str], List[str]]:
+    """找出所有可以归档的日志，按 (群目录, 月份) 分组"""
+    cutoff = (datetime.now() - timedelta(days=archive_after_days)).strftime('%Y-%m-%d')
+    jobs: Dict[Tuple[str, str], List[str]] = {}
+    for entry in os.scandir(storage_dir):
+        if not entry.is_dir():
+            continue
+        for name in os.listdir(entry.path):
+            if not name.endswith(".jsonl"):
+                continue
+            date = name[:-len(".jsonl")]
+            if len(date) == 10 and date < cutoff:
+                jobs.setdefault((entry.path, date[:7]), []).append(date)
+    return jobs
+
+
+def remove_expired_archives(storage_dir: str, retention_days: int) -> int:
+    """删除整个月都早于保留期限的归档，返回删除的归档数"""
+    cutoff = (datetime.now() - timedelta(days=retention_days)).strftime('%Y-%m')
+    removed = 0
+    for entry in os.scandir(storage_dir):
+        if not entry.is_dir():
+            continue
+        for name in os.listdir(entry.path):
+            if name.endswith(ARCHIVE_SUFFIX) and name[:7] < cutoff:
+                month = name[:7]
+                for path in (archive_path(entry.path, month), blocks_path(entry.path, month)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                removed += 1
+    return removed
+
+
+def run_compaction(pool, storage_dir: str, archive_after_days: int, retention_days: int = 0,
+                   block_records: int = 2048) -> Dict[str, int]:
+    """归档所有已结束的日志并清理过期归档（阻塞，放到线程池中调用），返回统计信息"""
+    started = time.monotonic()
+    jobs = find_closed_logs(storage_dir, archive_after_days)
+    futures = [pool.submit(compact_month, group_dir, month, dates, block_records)
+               for (group_dir, month), dates in jobs.items()]
+    stats = {"days": 0, "raw_bytes": 0, "compressed_bytes": 0, "failed": 0, "expired": 0}
+    for future in futures:
+        try:
+            days, raw_bytes, compressed_bytes = future.result()
+        except Exception as e:
+            print(f"归档消息日志失败: {e}")
+            stats["failed"] += 1
+            continue
+        stats["days"] += days
+        stats["raw_bytes"] += raw_bytes
+        stats["compressed_bytes"] += compressed_bytes
+    if retention_days > 0:
+        stats["expired"] = remove_expired_archives(storage_dir, retention_days)
+    stats["seconds"] = time.monotonic() - started
+    return stats
+
+
+def compact_logs(storage_dir: str, archive_after_days: int, retention_days: int = 0,
+                 workers: int = 2) -> Dict[str, int]:
+    """创建进程池完成一次归档后关闭（阻塞，放到线程池中调用）
+
+    进程池的创建和关闭都在调用线程中，任务被取消时事件循环不会阻塞在 shutdown 上。
+    机器人进程中已经有多个线程，fork 出的子进程可能停在继承来的锁上，所以用 spawn 启动子进程。
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return run_compaction(pool, storage_dir, archive_after_days, retention_days)
@@ -0,0 +1,98 @@
+"""按时间段缓存的消息要点
+
+消息按固定长度（segment_seconds，默认一小时）的时间段划分，时间段结束后它的要点只生成一次，
+保存在 <目录>/<群号>.jsonl 中，之后的总结（包括定时的日报）直接复用。
+每行是一个时间段的要点，或一条 {"report_time": ...}（上次定时总结的时间），按追加顺序后写的覆盖先写的。
+"""
+import os
+import json
+import time
+from typing import Dict, Optional
+
+
+class DigestStore:
+    """每个群一条时间段要点链，首次访问时从文件加载，超过 retention 秒的时间段在加载时清理
+
+    load/put/report_time/set_report_time 会读写文件，在事件循环中应放到线程中调用；
+    load 之后 get 只访问内存。
+    """
+
+    def __init__(self, directory: str, segment_seconds: int = 3600, retention: float = 8 * 86400):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self._groups: Dict[str, Dict] = {}  # 群号 -> {"segments": {开始时间: 要点}, "report_time": 时间}
+
+    def segment_start(self, timestamp: float) -> int:
+        """timestamp 所在时间段的开始时间"""
+        return int(timestamp) // self.segment_seconds * self.segment_seconds
+
+    def _path(self, group_id: str) -> str:
+        return os.path.join(self.directory, f"{group_id}.jsonl")
+
+    def load(self, group_id: str) -> Dict:
+        state = self._groups.get(group_id)
+        if state is not None:
+            return state
+        state = self._groups[group_id] = {"segments": {}, "report_time": 0.0}
+        try:
+            with open(self._path(group_id), "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return state
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if "report_time" in entry:
+                state["report_time"] = entry["report_time"]
+            elif "start" in entry:
+                state["segments"][entry["start"]] = entry
+        cutoff = time.time() - self.retention
+        expired = [start for start in state["segments"] if start < cutoff]
+        for start in expired:
+            del state["segments"][start]
+        if expired or len(lines) > len(state["segments"]) + 1:
+            self._rewrite(group_id, state)
+        return state
+
+    def _append(self, group_id: str, entry: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(group_id), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _rewrite(self, group_id: str, state: Dict):
+        """只保留仍然有效的条目，先写临时文件再替换"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(group_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for start in sorted(state["segments"]):
+                f.write(json.dumps(state["segments"][start], ensure_ascii=False) + "\n")
+            if state["report_time"]:
+                f.write(json.dumps({"report_time": state["report_time"]}) + "\n")
+        os.replace(temp_path, path)
+
+    def get(self, group_id: str, start: int, first: float, last: float) -> Optional[str]:
+        """取出时间段的要点；缓存的要点必须从同一条消息开始并覆盖到 last 才算命中
+        
+        总结从时间段中间开始时，缓存的要点会包含已经总结过的消息，不能直接使用。
+        """
+        entry = self.load(group_id)["segments"].get(start)
+        if entry is None or entry["first"] != first or entry["last"] < last:
+            return None
+        return entry["digest"]
+
+    def put(self, group_id: str, start: int, first: float, last: float, digest: str):
+        """保存一个已经结束的时间段的要点"""
+        entry = {"start": start, "end": start + self.segment_seconds, "first": first, "last": last, "digest": digest}
+        self.load(group_id)["segments"][start] = entry
+        self._append(group_id, entry)
+
+    def report_time(self, group_id: str) -> float:
+        return self.load(group_id)["report_time"]
+
+    def set_report_time(self, group_id: str, timestamp: float):
+        self.load(group_id)["report_time"] = timestamp
+        self._append(group_id, {"report_time": timestamp})
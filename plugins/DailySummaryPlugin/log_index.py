@@ -0,0 +1,102 @@
+"""消息日志的时间索引
+
+每个 <日期>.jsonl 旁边有一个 <日期>.idx，每隔 N 条记录保存一个 (时间戳, 字节偏移) 条目。
+日志按时间顺序追加，所以条目的时间戳单调不减，查询"某时间之后的消息"时二分找到起点，
+直接 seek 过去，只解析最后一段记录。
+
+索引不必覆盖整个日志：旧版本写的日志没有索引，插件重启后在文件中间续写时索引也从中间开始，
+起点之前没有条目时从文件开头读，结果同样正确。
+"""
+import os
+import json
+import struct
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+from .records import MessageRecord
+
+# (时间戳, 字节偏移)，小端定长，便于整块读取
+INDEX_ENTRY = struct.Struct("<qQ")
+
+
+def index_path(log_path: str) -> str:
+    return os.path.splitext(log_path)[0] + ".idx"
+
+
+def pack_entry(timestamp: float, offset: int) -> bytes:
+    return INDEX_ENTRY.pack(int(timestamp), offset)
+
+
+def load_index(log_path: str, log_size: Optional[int] = None) -> Tuple[List[int], List[int]]:
+    """读取日志的索引，返回 (时间戳列表, 偏移列表)；没有索引时返回空列表
+
+    偏移超出日志大小的条目（日志被截断或改写过）会被丢弃。
+    """
+    try:
+        with open(index_path(log_path), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], []
+    if log_size is None:
+        log_size = os.path.getsize(log_path)
+    timestamps: List[int] = []
+    offsets: List[int] = []
+    # 写到一半的末尾条目不完整，直接忽略
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    for timestamp, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+        if offset > log_size or (offsets and offset <= offsets[-1]):
+            break
+        timestamps.append(timestamp)
+        offsets.append(offset)
+    return timestamps, offsets
+
+
+def seek_offset(timestamps: List[int], offsets: List[int], after_timestamp: float) -> int:
+    """时间戳大于 after_timestamp 的第一条记录不会早于这个偏移"""
+    position = bisect_right(timestamps, after_timestamp)
+    return offsets[position - 1] if position else 0
+
+
+def build_index(log_path: str, every: int = 64) -> int:
+    """为没有索引的日志（旧版本写入的）补建索引，返回写入的条目数"""
+    entries = bytearray()
+    offset = 0
+    with open(log_path, "rb") as f:
+        for count, line in enumerate(f):
+            if count % every == 0 and line.strip():
+                try:
+                    entries += pack_entry(json.loads(line)["timestamp"], offset)
+                except (ValueError, KeyError):
+                    pass
+            offset += len(line)
+    temp_path = index_path(log_path) + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(entries)
+    os.replace(temp_path, index_path(log_path))
+    return len(entries) // INDEX_ENTRY.size
+
+
+def read_log(log_path: str, after_timestamp: Optional[float] = None) -> List[MessageRecord]:
+    """读取日志中时间戳大于 after_timestamp 的记录（按写入顺序）；after_timestamp 为 None 时读取全部
+
+    日志不存在时抛出 FileNotFoundError，调用方可以转而读取归档。
+    """
+    log_size = os.path.getsize(log_path)
+    start = 0
+    if after_timestamp is not None:
+        start = seek_offset(*load_index(log_path, log_size), after_timestamp)
+    messages = []
+    with open(log_path, "rb") as f:
+        f.seek(start)
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                msg = MessageRecord.from_dict(json.loads(line))
+            except (ValueError, KeyError) as e:
+                # 崩溃时可能留下半行，跳过即可
+                print(f"消息日志中有无法解析的行 {log_path}: {e}")
+                continue
+            if after_timestamp is None or msg.timestamp > after_timestamp:
+                messages.append(msg)
+    return messages
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .log_index import index_path, pack_entry
+from .records import MessageRecord
+
+class _Flush:
+    """队列中的刷新请求：写入任务写完它之前的所有消息后设置 future，flush() 等待它"""
+
+    __slots__ = ("future",)
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+
+
+class _LogHandle:
+    """一个群当天的日志及其索引的句柄"""
+
+    __slots__ = ("date", "path", "log", "index", "offset", "since_entry")
+
+    def __init__(self, date: str, path: str):
+        self.date = date
+        self.path = path
+        self.log = open(path, "ab")
+        self.index = open(index_path(path), "ab")
+        self.offset = self.log.seek(0, os.SEEK_END)
+        # 续写已有文件时，第一条新记录就写一个索引条目
+        self.since_entry = None
+
+    def sync(self):
+        os.fsync(self.log.fileno())
+        os.fsync(self.index.fileno())
+
+    def close(self):
+        try:
+            self.log.flush()
+            self.index.flush()
+            self.sync()
+        finally:
+            self.log.close()
+            self.index.close()
+
+
+def log_date(timestamp: float) -> str:
+    """消息所属的日志日期（本地时间）"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+
+class MessageLogWriter:
+    """消息日志的后台批量写入器
+
+    write() 只把消息放进队列，由一个后台任务按群/日期分组后批量追加到
+    <storage_dir>/<群号>/<日期>.jsonl：攒够 batch_size 条或距第一条未写消息超过 flush_interval 秒时写一次。
+    每个群保持当天日志的文件句柄，跨过零点后写入新日期时关闭旧句柄；
+    文件 IO 在线程池中进行，不阻塞事件循环。fsync 至多每 fsync_interval 秒一次（0 表示每批都 fsync）。
+    每 index_every 条记录向 <日期>.idx 追加一个 (时间戳, 偏移) 索引条目，见 log_index。
+    """
+
+    def __init__(self, storage_dir: str, batch_size: int = 256, flush_interval: float = 1.0,
+                 fsync_interval: float = 5.0, index_every: int = 64, queue_size: int = 10000,
+                 max_open_files: int = 256):
+        self.storage_dir = storage_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.index_every = index_every
+        self.max_open_files = max_open_files
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._task: Optional[asyncio.Task] = None
+        # 群号 -> 当天日志的句柄，只在线程池中按顺序访问
+        self._handles: "OrderedDict[str, _LogHandle]" = OrderedDict()
+        self._unsynced: Dict[str, _LogHandle] = {}
+        self._last_fsync = time.monotonic()
+
+    def path_for(self, group_id: str, date: str) -> str:
+        return os.path.join(self.storage_dir, str(group_id), f"{date}.jsonl")
+
+    async def write(self, group_id, record: MessageRecord):
+        """提交一条消息记录；队列已满（磁盘跟不上）时等待，而不是丢弃消息"""
+        self.start()
+        await self._queue.put((str(group_id), record))
+
+    async def flush(self):
+        """等待此前提交的所有消息写入文件，读取日志前调用"""
+        if self._task is None or self._task.done():
+            return
+        # 只等待排在刷新请求之前的消息，持续有新消息进入时也能返回
+        request = _Flush(asyncio.get_running_loop().create_future())
+        await self._queue.put(request)
+        await request.future
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            batch: List[Tuple[str, MessageRecord]] = []
+            flushes: List[_Flush] = []
+            deadline = loop.time() + self.flush_interval
+            # 收集一批：够 batch_size 条、超过 flush_interval 或收到刷新请求时写入
+            while True:
+                if isinstance(item, _Flush):
+                    flushes.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+            try:
+                if batch:
+                    await self._write(batch)
+            finally:
+                # 刷新请求之前的消息都在这一批或更早的批次中，已经写入
+                for request in flushes:
+                    if not request.future.done():
+                        request.future.set_result(None)
+
+    async def _write(self, batch: List[Tuple[str, MessageRecord]]):
+        future = asyncio.get_running_loop().run_in_executor(None, self._write_batch, batch)
+        try:
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 被取消时也要等线程中的写入结束，避免关闭句柄时与之冲突
+                await future
+                raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"写入消息日志失败: {e}")
+
+    def _handle(self, group_id: str, date: str) -> _LogHandle:
+        """取得群当天日志的句柄；日期变化时关闭旧句柄，打开的文件过多时关闭最久未用的"""
+        handle = self._handles.get(group_id)
+        if handle is not None:
+            if handle.date == date:
+                self._handles.move_to_end(group_id)
+                return handle
+            self._close_handle(group_id)
+        path = self.path_for(group_id, date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle = self._handles[group_id] = _LogHandle(date, path)
+        while len(self._handles) > self.max_open_files:
+            self._close_handle(next(iter(self._handles)))
+        return handle
+
+    def _close_handle(self, group_id: str):
+        handle = self._handles.pop(group_id)
+        self._unsynced.pop(handle.path, None)
+        handle.close()
+
+    def _write_batch(self, batch: List[Tuple[str, MessageRecord]]):
+        """在线程池中执行：按文件分组拼接后各写一次，再追加这一段的索引条目"""
+        grouped: Dict[Tuple[str, str], List[MessageRecord]] = {}
+        for group_id, record in batch:
+            grouped.setdefault((group_id, log_date(record.timestamp)), []).append(record)
+        for (group_id, date), records in grouped.items():
+            handle = self._handle(group_id, date)
+            data = bytearray()
+            entries = bytearray()
+            for record in records:
+                if handle.since_entry is None or handle.since_entry >= self.index_every:
+                    entries += pack_entry(record.timestamp, handle.offset + len(data))
+                    handle.since_entry = 0
+                handle.since_entry += 1
+                data += (json.dumps(record.to_dict(), ensure_ascii=False) + "\n").encode("utf-8")
+            # 先写日志再写索引，中途崩溃时索引只会落后，不会指向不存在的记录
+            handle.log.write(data)
+            handle.log.flush()
+            handle.offset += len(data)
+            if entries:
+                handle.index.write(entries)
+                handle.index.flush()
+            self._unsynced[handle.path] = handle
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self):
+        for handle in self._unsynced.values():
+            handle.sync()
+        self._unsynced.clear()
+        self._last_fsync = time.monotonic()
+
+    def _close_all(self):
+        for group_id in list(self._handles):
+            try:
+                self._close_handle(group_id)
+            except Exception as e:
+                print(f"关闭消息日志失败 {group_id}: {e}")
+
+    async def close(self):
+        """写完队列中剩余的消息，fsync 并关闭所有文件"""
+        if self._task is not None and not self._task.done():
+            await self.flush()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await asyncio.get_running_loop().run_in_executor(None, self._close_all)
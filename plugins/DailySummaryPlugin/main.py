@@ -1,9 +1,9 @@
 import os
 import json
+import math
 import time
-import schedule
-import threading
 import asyncio
+from bisect import bisect_right
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 from collections import defaultdict
@@ -15,8 +15,22 @@ from ncatbot.plugin import BasePlugin, CompatibleEnrollment
 from ncatbot.core.message import GroupMessage
 from ncatbot.core.element import MessageChain, Text
 
+from .log_writer import MessageLogWriter, log_date
+from .log_index import build_index, index_path, read_log
+from .archive import compact_logs, read_archived
+from .message_buffer import MessageBuffer
+from .records import MessageRecord, format_time
+from .scheduler import JobScheduler, stagger_offset
+from .digests import DigestStore
+from .prompt import (SYSTEM_PROMPT, SUMMARY_PROMPT, WINDOW_PROMPT, REDUCE_PROMPT, MERGE_PROMPT, PromptLine,
+                     compact_messages, fit_to_budget, group_by_budget, line_tokens, render_lines, split_windows)
+
 bot = CompatibleEnrollment
 
+# 定时总结本身要排队等待并发名额、请求 LLM，记录的总结时间会比到期时间晚一些，
+# 相邻两次定时总结的间隔因此略小于 auto_summary_interval；判断间隔时留出这部分余量
+AUTO_SUMMARY_GRACE = 0.1
+
 class DailySummaryPlugin(BasePlugin):
     name = "DailySummaryPlugin"
     version = "1.0.0"
@@ -112,6 +126,26 @@ class DailySummaryPlugin(BasePlugin):
             "trigger_keywords": ["总结"],
             "storage_path": "message_logs",  # 消息存储路径
             "save_interval": 300,  # 定期保存间隔（秒）
+            "summary_concurrency": 2,  # 同时进行的自动总结数
+            "summary_stagger": 600,  # 各群的自动总结在这个时间窗口（秒）内错开
+            "summary_context_tokens": 6000,  # 一次请求中消息的 token 上限，超出时分段总结
+            "summary_map_concurrency": 4,  # 分段总结时同时请求的段数
+            "summary_map_max_tokens": 300,  # 每段要点的最大 token 数
+            "summary_max_message_chars": 300,  # 单条消息在提示词中的最大字数，超出部分截断
+            "summary_dedupe_similarity": 0.8,  # 连续消息的相似度不低于此值时合并为一行
+            "summary_segment_minutes": 60,  # 增量总结的时间段长度（分钟），0 表示不使用增量总结
+            "summary_segment_inline_tokens": 200,  # 消息少于这个 token 数的时间段不单独总结
+            "digest_path": "digests",  # 时间段要点的存储路径
+            "log_batch_size": 256,  # 消息日志每批最多写入的条数
+            "log_flush_interval": 1.0,  # 消息日志最长攒批时间（秒）
+            "log_fsync_interval": 5.0,  # 消息日志 fsync 间隔（秒），0 表示每批都 fsync
+            "log_index_interval": 64,  # 消息日志每隔多少条记录写一个时间索引条目
+            "archive_after_days": 7,  # 超过多少天的日志压缩归档
+            "archive_interval": 86400,  # 归档任务的运行间隔（秒）
+            "archive_workers": 2,  # 归档使用的进程数
+            "log_retention_days": 0,  # 归档保留天数，0 表示永久保留
+            "buffer_capacity": 5000,  # 每个群在内存中最多保留的消息数
+            "buffer_budget_mb": 64,  # 所有群的内存消息合计上限（MB，估算值）
         }
     
     def load_summary_times(self) -> Dict[str, float]:
@@ -149,14 +183,18 @@ class DailySummaryPlugin(BasePlugin):
         except Exception as e:
             print(f"保存总结时间记录失败: {str(e)}")
     
-    def periodic_save(self):
+    async def periodic_save(self):
         """定期保存数据"""
         self.save_summary_times()
     
     async def on_load(self):
         """插件加载时执行的操作"""
-        self.message_store = defaultdict(list)  # 存储群聊消息
         self.config = self.load_config()
+        # 存储群聊消息，超出容量的旧消息只保留在日志中
+        self.message_buffer = MessageBuffer(
+            capacity=self.config.get("buffer_capacity", 5000),
+            budget=int(self.config.get("buffer_budget_mb", 64) * 1024 * 1024),
+        )
         
         # 加载上次总结时间记录
         summary_times = self.load_summary_times()
@@ -171,6 +209,13 @@ class DailySummaryPlugin(BasePlugin):
         # 创建消息存储目录
         self.storage_dir = os.path.join(os.path.dirname(__file__), self.config["storage_path"])
         os.makedirs(self.storage_dir, exist_ok=True)
+        self.log_writer = MessageLogWriter(
+            self.storage_dir,
+            batch_size=self.config.get("log_batch_size", 256),
+            flush_interval=self.config.get("log_flush_interval", 1.0),
+            fsync_interval=self.config.get("log_fsync_interval", 5.0),
+            index_every=self.config.get("log_index_interval", 64),
+        )
         
         # 为每个已有总结时间记录的群组预加载最近的消息
         for group_id in self.last_summary_time.keys():
@@ -189,17 +234,24 @@ class DailySummaryPlugin(BasePlugin):
                 except Exception as e:
                     print(f"初始化API客户端失败 {api_name}: {str(e)}")
         
-        # 设置定时任务，使用自动总结间隔
-        auto_interval = self.config.get("auto_summary_interval", 43200)  # 默认12小时
-        schedule.every(auto_interval).seconds.do(self.scheduled_summary)
+        # 已结束时间段的要点缓存，保留到日志补读范围（7 天）之外一天
+        self.digests = DigestStore(
+            os.path.join(os.path.dirname(__file__), self.config.get("digest_path", "digests")),
+            segment_seconds=max(1, self.config.get("summary_segment_minutes", 60)) * 60,
+            retention=8 * 86400,
+        )
         
-        # 设置定期保存任务
+        # 所有定时任务都在事件循环中的同一个调度器里运行：每个群的自动总结、定期保存和日志归档
+        auto_interval = self.config.get("auto_summary_interval", 43200)  # 默认12小时
         save_interval = self.config.get("save_interval", 300)  # 默认5分钟
-        schedule.every(save_interval).seconds.do(self.periodic_save)
-        
-        # 启动定时任务线程
-        self.scheduler_thread = threading.Thread(target=self.run_scheduler, daemon=True)
-        self.scheduler_thread.start()
+        self.scheduler = JobScheduler(concurrency=self.config.get("summary_concurrency", 2))
+        self.scheduler.every("save", save_interval, self.periodic_save)
+        # 启动一分钟后归档一次，之后每隔 archive_interval 秒归档一次
+        self.scheduler.every("archive", self.config.get("archive_interval", 86400), self.archive_logs,
+                             first_due=time.time() + 60)
+        for group_id in self.last_summary_time.keys():
+            self.schedule_group(group_id)
+        self.scheduler.start()
         
         print(f"{self.name} 插件已加载")
         print(f"插件版本: {self.version}")
@@ -211,17 +263,54 @@ class DailySummaryPlugin(BasePlugin):
         print(f"手动总结间隔: {self.config.get('manual_summary_interval', 300)}秒")
         print(f"数据将每 {save_interval} 秒自动保存一次")
     
-    def run_scheduler(self):
-        """运行定时任务"""
-        while True:
-            try:
-                schedule.run_pending()
-                time.sleep(1)
-            except Exception as e:
-                print(f"定时任务执行出错: {str(e)}")
+    def next_summary_time(self, group_id: str, after: float) -> float:
+        """after 及之后该群的第一个定时总结时间
+
+        各群的定时总结固定在 k * auto_summary_interval + 错开偏移 的时间点上，
+        偏移按群号在 summary_stagger 秒内取，避免所有群的总结同时到期。
+        """
+        interval = self.config.get("auto_summary_interval", 43200)
+        offset = stagger_offset(group_id, self.config.get("summary_stagger", 600))
+        return math.ceil((after - offset) / interval) * interval + offset
+    
+    def schedule_group(self, group_id: str):
+        """为群安排自动总结（已安排过的群直接返回）"""
+        key = ("summary", group_id)
+        if key in self.scheduler:
+            return
+        interval = self.config.get("auto_summary_interval", 43200)
+        last_time = self.last_summary_time.get(group_id)
+        if last_time is None:
+            # 从未总结过的群从现在起至少等一个完整的间隔，而不是加载后立即总结
+            first_due = self.next_summary_time(group_id, time.time() + interval)
+        else:
+            first_due = self.next_summary_time(
+                group_id, max(last_time + interval * (1 - AUTO_SUMMARY_GRACE), time.time()))
+        self.scheduler.every(key, interval, lambda: self.run_scheduled_summary(group_id),
+                             first_due=first_due, limited=True)
+    
+    async def archive_logs(self):
+        """在进程池中把已结束的日志压缩归档到月归档中，并清理过期归档"""
+        # 今天的日志还在写入，至少要隔一天才归档
+        archive_after_days = max(1, self.config.get("archive_after_days", 7))
+        stats = await asyncio.get_running_loop().run_in_executor(
+            None, compact_logs, self.storage_dir, archive_after_days,
+            self.config.get("log_retention_days", 0), self.config.get("archive_workers", 2))
+        if stats["days"] or stats["failed"] or stats["expired"]:
+            print(f"已归档 {stats['days']} 天的消息日志："
+                  f"{stats['raw_bytes'] / 1024 / 1024:.1f}MB -> {stats['compressed_bytes'] / 1024 / 1024:.1f}MB，"
+                  f"失败 {stats['failed']} 个，删除过期归档 {stats['expired']} 个，耗时 {stats['seconds']:.1f} 秒")
     
     async def on_unload(self):
         """插件卸载时执行的操作"""
+        await self.scheduler.stop()
+        
+        # 写完缓冲中的消息日志
+        try:
+            await self.log_writer.close()
+        except Exception as e:
+            print(f"{self.name} 插件卸载时写入消息日志失败: {str(e)}")
+        
         # 保存总结时间记录
         try:
             self.save_summary_times()
@@ -231,39 +320,25 @@ class DailySummaryPlugin(BasePlugin):
     
     async def store_message(self, msg: GroupMessage):
         """存储消息记录，包括发言人和时间"""
-        group_id = msg.group_id
+        group_id = str(msg.group_id)
         user_id = msg.sender.user_id
         nickname = msg.sender.nickname
         message_content = msg.raw_message
         timestamp = int(time.time()) # 也许以后可以用 msg.time
-        formatted_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 创建消息记录对象
-        message_record = {
-            "user_id": user_id,
-            "nickname": nickname,
-            "content": message_content,
-            "timestamp": timestamp,
-            "formatted_time": formatted_time
-        }
         
-        # 添加到内存中的消息存储
-        self.message_store[group_id].append(message_record)
+        # 创建消息记录对象，格式化的时间在生成总结时才计算
+        message_record = MessageRecord(timestamp, user_id, nickname, message_content)
         
-        # 将消息写入到日志文件
-        today = datetime.now().strftime('%Y-%m-%d')
-        group_dir = os.path.join(self.storage_dir, str(group_id))
-        os.makedirs(group_dir, exist_ok=True)
+        # 添加到内存中的消息存储
+        self.message_buffer.append(group_id, message_record)
         
-        log_file = os.path.join(group_dir, f"{today}.jsonl")
+        # 交给后台写入任务批量追加到日志文件，不在这里做磁盘 IO
+        await self.log_writer.write(group_id, message_record)
         
-        try:
-            with open(log_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(message_record, ensure_ascii=False) + "\n")
-        except Exception as e:
-            print(f"存储消息时出错: {str(e)}")
+        # 新群加入自动总结
+        self.schedule_group(group_id)
     
-    async def load_recent_messages(self, group_id: str, days: int = 1, after_timestamp: float = None) -> List[Dict]:
+    async def load_recent_messages(self, group_id: str, days: int = 1, after_timestamp: float = None) -> List[MessageRecord]:
         """加载最近几天的消息记录
         
         Args:
@@ -271,95 +346,226 @@ class DailySummaryPlugin(BasePlugin):
             days: 加载最近几天的消息
             after_timestamp: 只加载该时间戳之后的消息，如果为None则加载所有消息
         """
-        messages = []
         group_dir = os.path.join(self.storage_dir, str(group_id))
         
         if not os.path.exists(group_dir):
-            return messages
+            return []
         
-        # 获取最近几天的日期
-        dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+        # 先让缓冲中的消息落盘，保证读到最新的记录
+        await self.log_writer.flush()
         
+        # 获取最近几天的日期，从早到晚排列；早于 after_timestamp 当天的日志不用读
+        dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in reversed(range(days))]
+        if after_timestamp:
+            first_date = log_date(after_timestamp)
+            dates = [date for date in dates if date >= first_date]
+        
+        # 日志按时间顺序追加，按日期顺序拼接后就是有序的，不需要再排序
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.read_log_files, group_dir, dates, after_timestamp)
+        except Exception as e:
+            print(f"加载消息记录时出错: {str(e)}")
+            return []
+    
+    def read_log_files(self, group_dir: str, dates: List[str], after_timestamp: Optional[float]) -> List[MessageRecord]:
+        """在线程池中按日期依次读取日志，借助时间索引只解析 after_timestamp 之后的部分
+
+        已经归档的日期从月归档中读取，只解压相关的块。
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        messages = []
         for date in dates:
             log_file = os.path.join(group_dir, f"{date}.jsonl")
-            if os.path.exists(log_file):
+            # 旧版本写的日志没有索引，已经结束的日期补建一次
+            if date != today and os.path.exists(log_file) and not os.path.exists(index_path(log_file)):
                 try:
-                    with open(log_file, "r", encoding="utf-8") as f:
-                        for line in f:
-                            if line.strip():
-                                msg = json.loads(line)
-                                # 如果指定了时间戳，只加载该时间戳之后的消息
-                                if after_timestamp is None or msg["timestamp"] > after_timestamp:
-                                    messages.append(msg)
+                    build_index(log_file, self.config.get("log_index_interval", 64))
                 except Exception as e:
-                    print(f"加载消息记录时出错: {str(e)}")
-        
-        # 按时间戳排序
-        messages.sort(key=lambda x: x["timestamp"])
+                    print(f"为 {log_file} 建立索引失败: {str(e)}")
+            try:
+                messages.extend(read_log(log_file, after_timestamp))
+            except FileNotFoundError:
+                # 归档完成后才会删除日志，日志不存在时归档中一定已有这一天（或这一天没有消息）
+                messages.extend(read_archived(group_dir, date, after_timestamp))
         return messages
 
-    async def filter_messages_after_last_summary(self, messages: List[Dict], group_id: str) -> List[Dict]:
+    async def get_pending_messages(self, group_id: str, since: Optional[float] = None) -> List[MessageRecord]:
+        """上次总结（或 since）之后的消息：优先使用内存，其中一部分已经溢出时从日志读取"""
+        last_time = self.last_summary_time.get(group_id, 0.0) if since is None else since
+        if self.message_buffer.complete_after(group_id, last_time):
+            records = self.message_buffer.records(group_id)
+            if since is None:
+                return await self.filter_messages_after_last_summary(records, group_id)
+            return records[bisect_right(records, since, key=lambda msg: msg.timestamp):]
+        return await self.load_recent_messages(group_id, days=7, after_timestamp=last_time)
+    
+    async def filter_messages_after_last_summary(self, messages: List[MessageRecord], group_id: str) -> List[MessageRecord]:
         """过滤出上次总结之后的消息"""
-        last_summary_time = self.last_summary_time[group_id]
+        last_summary_time = self.last_summary_time.get(group_id, 0.0)
         if last_summary_time == 0:
             return messages  # 如果没有上次总结时间，返回所有消息
         
-        # 只保留上次总结之后的消息
-        return [msg for msg in messages if msg["timestamp"] > last_summary_time]
+        # 消息按时间顺序排列，二分找到上次总结之后的第一条
+        start = bisect_right(messages, last_summary_time, key=lambda msg: msg.timestamp)
+        return messages[start:]
     
-    async def generate_summary(self, messages: List[Dict], group_id: str) -> str:
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None) -> Optional[str]:
+        """调用默认 API 生成回复，同步的 OpenAI 客户端放到线程中调用，不阻塞事件循环"""
+        api_name = self.api_configs["default"]
+        config = self.api_configs[api_name]
+        client = self.clients[api_name]
+        
+        # 准备API调用参数
+        api_params = {
+            "model": config["model"],
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "stream": False,
+        }
+        
+        # 添加其他参数
+        if "params" in config:
+            api_params.update(config["params"])
+        if max_tokens is not None:
+            api_params["max_tokens"] = max_tokens
+        
+        # 调用API生成响应
+        response = await asyncio.to_thread(client.chat.completions.create, **api_params)
+        
+        if response and hasattr(response, 'choices') and response.choices:
+            return response.choices[0].message.content
+        return None
+    
+    async def generate_summary(self, messages: List[MessageRecord], group_id: str) -> str:
         """使用 LLM 生成消息总结"""
         api_name = self.api_configs.get("default", "none")
         if api_name == "none" or api_name not in self.clients:
             return "LLM 服务未正确初始化，无法生成总结。请检查 .env 文件中的 API 配置。"
         
         try:
-            # 构建提示词，包含发言人和时间信息
-            formatted_messages = []
-            for msg in messages:
-                formatted_messages.append(f"[{msg['formatted_time']}] {msg['nickname']}({msg['user_id']}): {msg['content']}")
-            
-            prompt = f"""请对以下群聊消息进行总结：
-
-{'\\n'.join(formatted_messages)}
-
-请以时间段为基础，简洁地总结以下内容：
-1. 各个时间段内的主要讨论主题
-2. 谁与谁之间进行了哪些重要互动或讨论
-
-总结应当客观、全面，突出重点内容，忽略无意义的闲聊。总共在 200 字以内。
-"""
-            
-            # 获取API配置
-            config = self.api_configs[api_name]
-            client = self.clients[api_name]
-            
-            # 准备API调用参数
-            api_params = {
-                "model": config["model"],
-                "messages": [
-                    {"role": "system", "content": "你是一个专业的群聊总结助手，善于提取重要信息并做出简洁的总结。"},
-                    {"role": "user", "content": prompt}
-                ],
-                "stream": False,
-            }
-            
-            # 添加其他参数
-            if "params" in config:
-                api_params.update(config["params"])
-            
-            # 调用API生成响应
-            response = client.chat.completions.create(**api_params)
+            # 构建提示词，包含发言人和时间信息；先去掉表情、刷屏等冗余内容
+            lines = compact_messages(
+                messages,
+                max_chars=self.config.get("summary_max_message_chars", 300),
+                dedupe_threshold=self.config.get("summary_dedupe_similarity", 0.8),
+            )
+            if not lines:
+                return "这段时间的消息都是图片或表情，没有可以总结的内容。"
+            budget = self.config.get("summary_context_tokens", 6000)
             
-            if response and hasattr(response, 'choices') and response.choices:
-                return response.choices[0].message.content
+            if self.config.get("summary_segment_minutes", 60) > 0:
+                # 复用已结束时间段的要点，只总结新消息
+                summary = await self.rolling_summary(str(group_id), lines, budget)
+            elif sum(line_tokens(line) for line in lines) <= budget:
+                summary = await self.complete(SUMMARY_PROMPT.format(messages=render_lines(lines)))
             else:
-                return "对不起，我暂时无法生成总结，请稍后再试。"
+                # 一次放不进上下文，分段总结后再合并
+                summary = await self.map_reduce_summary(lines, budget)
+            
+            return summary or "对不起，我暂时无法生成总结，请稍后再试。"
                 
         except Exception as e:
             print(f"生成总结时出错: {str(e)}")
             return f"生成总结时发生错误: {str(e)}"
     
+    async def map_reduce_summary(self, lines: List[PromptLine], budget: int) -> Optional[str]:
+        """分段总结大量消息
+        
+        map：按 token 预算把消息切成连续的时间段，以有限的并发同时总结各段；
+        reduce：把各段要点合并成最终总结，要点合计仍超出预算时先分组合并，逐层减少。
+        总耗时取决于最慢的一段，而不是消息总量。
+        """
+        semaphore = asyncio.Semaphore(self.config.get("summary_map_concurrency", 4))
+        partials = await self.summarize_windows(split_windows(lines, budget), semaphore)
+        if not partials:
+            return None
+        return await self.reduce_partials(partials, budget, semaphore)
+    
+    async def rolling_summary(self, group_id: str, lines: List[PromptLine], budget: int) -> Optional[str]:
+        """增量总结：按固定时间段划分消息，已结束时间段的要点只生成一次并缓存，之后直接复用
+        
+        消息很少的时间段直接把消息原文放进最终请求，不单独总结；尚未结束的时间段每次重新总结（不缓存）。
+        每次总结的 LLM 用量只与新增的消息有关，而不是总结覆盖的时间长度。
+        """
+        semaphore = asyncio.Semaphore(self.config.get("summary_map_concurrency", 4))
+        inline_tokens = self.config.get("summary_segment_inline_tokens", 200)
+        now = time.time()
+        segments: Dict[int, List[PromptLine]] = {}
+        for line in lines:
+            segments.setdefault(self.digests.segment_start(line.timestamp), []).append(line)
+        # 先在线程中加载要点链，之后查询只访问内存
+        await asyncio.to_thread(self.digests.load, group_id)
+        
+        async def section(start: int, segment: List[PromptLine]) -> Optional[str]:
+            first, last = segment[0].timestamp, segment[-1].timestamp
+            closed = start + self.digests.segment_seconds <= now
+            tokens = sum(line_tokens(line) for line in segment)
+            if tokens <= inline_tokens or (not closed and tokens <= budget // 2):
+                return f"【{format_time(first)} 至 {format_time(last)} 的消息】\n{render_lines(segment)}"
+            if closed:
+                cached = self.digests.get(group_id, start, first, last)
+                if cached is not None:
+                    return cached
+            windows = split_windows(segment, budget)
+            partials = await self.summarize_windows(windows, semaphore)
+            if not partials:
+                return None
+            digest = "\n\n".join(partials)
+            # 有失败的部分时不缓存，下次重新生成
+            if closed and len(partials) == len(windows):
+                await asyncio.to_thread(self.digests.put, group_id, start, first, last, digest)
+            return digest
+        
+        results = await asyncio.gather(*(section(start, segment) for start, segment in segments.items()))
+        sections = [result for result in results if result]
+        if not sections:
+            return None
+        return await self.reduce_partials(sections, budget, semaphore)
+    
+    async def summarize_windows(self, windows: List[List[PromptLine]], semaphore: asyncio.Semaphore) -> List[str]:
+        """并发总结若干时间段，返回带时间标注的要点（失败的时间段被跳过）"""
+        max_tokens = self.config.get("summary_map_max_tokens", 300)
+        
+        async def summarize_window(window: List[PromptLine]) -> Optional[str]:
+            start = format_time(window[0].timestamp)
+            end = format_time(window[-1].timestamp)
+            prompt = WINDOW_PROMPT.format(start=start, end=end, max_chars=max_tokens, messages=render_lines(window))
+            async with semaphore:
+                partial = await self.complete(prompt, max_tokens=max_tokens)
+            return f"【{start} 至 {end}】\n{partial}" if partial else None
+        
+        results = await asyncio.gather(*(summarize_window(window) for window in windows), return_exceptions=True)
+        partials = [result for result in results if isinstance(result, str)]
+        if len(partials) < len(windows):
+            errors = [result for result in results if isinstance(result, Exception)]
+            print(f"分段总结中有 {len(windows) - len(partials)}/{len(windows)} 段失败"
+                  + (f": {str(errors[0])}" if errors else ""))
+        return partials
+    
+    async def reduce_partials(self, partials: List[str], budget: int, semaphore: asyncio.Semaphore) -> Optional[str]:
+        """把按时间排列的各段要点合并成最终总结，合计超出预算时先分组合并，逐层减少"""
+        max_tokens = self.config.get("summary_map_max_tokens", 300)
+        
+        async def merge(group: List[str]) -> Optional[str]:
+            prompt = MERGE_PROMPT.format(partials="\n\n".join(group), max_chars=max_tokens * 2)
+            async with semaphore:
+                return await self.complete(prompt, max_tokens=max_tokens * 2)
+        
+        groups = group_by_budget(partials, budget)
+        while len(groups) > 1:
+            merged = await asyncio.gather(*(merge(group) for group in groups))
+            regrouped = group_by_budget([text for text in merged if text], budget)
+            if not regrouped or len(regrouped) >= len(groups):
+                # 合并后没有变短，不再继续合并
+                break
+            groups = regrouped
+        # 合并不能继续减少时，截断最长的几段，保证最终请求不超出预算
+        partials = fit_to_budget([text for group in groups for text in group], budget)
+        return await self.complete(REDUCE_PROMPT.format(partials="\n\n".join(partials)))
+    
     async def check_summary_conditions(self, group_id: str, is_manual: bool = False) -> Tuple[bool, str]:
         """检查是否满足生成总结的条件
         
@@ -368,13 +574,14 @@ class DailySummaryPlugin(BasePlugin):
             is_manual: 是否为手动触发的总结
         """
         current_time = time.time()
-        last_time = self.last_summary_time[group_id]
+        last_time = self.last_summary_time.get(group_id, 0.0)
         
         # 根据是否手动触发选择不同的时间间隔
         if is_manual:
             interval = self.config.get("manual_summary_interval", 300)  # 默认5分钟
         else:
             interval = self.config.get("auto_summary_interval", 43200)  # 默认12小时
+            interval *= 1 - AUTO_SUMMARY_GRACE
         
         # 检查时间间隔
         if current_time - last_time < interval:
@@ -385,7 +592,7 @@ class DailySummaryPlugin(BasePlugin):
                 return False, f"距离上次自动总结时间太短，还需 {remaining} 秒"
         
         # 过滤出上次总结之后的消息
-        messages = await self.filter_messages_after_last_summary(self.message_store[group_id], group_id)
+        messages = await self.get_pending_messages(group_id)
         
         # 检查消息数量
         if len(messages) < self.config["min_messages"]:
@@ -419,19 +626,41 @@ class DailySummaryPlugin(BasePlugin):
             except Exception as e2:
                 print(f"发送总结失败后保存时间记录失败: {str(e2)}")
     
-    async def scheduled_summary(self):
-        """定时任务：为所有群生成总结"""
-        for group_id in self.message_store.keys():
-            can_summarize, error_msg = await self.check_summary_conditions(group_id, is_manual=False)
-            if can_summarize:
-                # 过滤出上次总结之后的消息
-                messages = await self.filter_messages_after_last_summary(self.message_store[group_id], group_id)
-                if len(messages) >= self.config["min_messages"]:
-                    summary = await self.generate_summary(messages, group_id)
-                    await self.send_summary(group_id, summary)
-                    # 不清空消息存储，因为已经持久化到文件中
-                    # 但可以清空内存中的消息以节省内存
-                    self.message_store[group_id] = []
+    async def run_scheduled_summary(self, group_id: str) -> Optional[float]:
+        """定时任务：为一个群生成总结
+        
+        Returns:
+            期间的手动总结使下次自动总结需要推迟时，返回推迟后的时间（仍在该群的错开时间点上）；
+            否则为 None，由调度器按固定间隔安排，保持该群的错开偏移
+        """
+        summarized = False
+        can_summarize, error_msg = await self.check_summary_conditions(group_id, is_manual=False)
+        if can_summarize:
+            # 过滤出上次总结之后的消息
+            messages = await self.get_pending_messages(group_id)
+            if len(messages) >= self.config["min_messages"]:
+                if self.config.get("summary_segment_minutes", 60) > 0:
+                    # 定时总结覆盖上次定时总结以来的全部消息，期间手动总结生成的时间段要点直接复用
+                    report_time = await asyncio.to_thread(self.digests.report_time, group_id)
+                    if report_time and report_time < self.last_summary_time.get(group_id, 0.0):
+                        messages = await self.get_pending_messages(group_id, since=report_time)
+                summary = await self.generate_summary(messages, group_id)
+                await self.send_summary(group_id, summary)
+                summarized = True
+                if self.config.get("summary_segment_minutes", 60) > 0:
+                    await asyncio.to_thread(self.digests.set_report_time, group_id, time.time())
+                # 不清空消息存储，因为已经持久化到文件中
+                # 但可以清空内存中的消息以节省内存
+                self.message_buffer.clear(group_id)
+        last_time = self.last_summary_time.get(group_id)
+        if summarized or last_time is None:
+            return None
+        interval = self.config.get("auto_summary_interval", 43200)
+        earliest = last_time + interval * (1 - AUTO_SUMMARY_GRACE)
+        if earliest > time.time():
+            # 最近有手动总结，推迟到它满一个间隔之后该群的下一个错开时间点
+            return self.next_summary_time(group_id, earliest)
+        return None
     
     @bot.group_event()
     async def on_group_message(self, msg: GroupMessage):
@@ -439,23 +668,25 @@ class DailySummaryPlugin(BasePlugin):
         # 存储消息，包含发言人和时间信息
         await self.store_message(msg)
         
+        group_id = str(msg.group_id)
+        
         # 检查是否是触发关键词
         if msg.raw_message in self.config["trigger_keywords"]:
-            can_summarize, error_msg = await self.check_summary_conditions(msg.group_id, is_manual=True)
+            can_summarize, error_msg = await self.check_summary_conditions(group_id, is_manual=True)
             if can_summarize:
                 # 过滤出上次总结之后的消息
-                messages = await self.filter_messages_after_last_summary(self.message_store[msg.group_id], msg.group_id)
+                messages = await self.get_pending_messages(group_id)
                 if len(messages) >= self.config["min_messages"]:
-                    summary = await self.generate_summary(messages, msg.group_id)
-                    await self.send_summary(msg.group_id, summary)
-                    self.message_store[msg.group_id] = []  # 清空内存中的消息
+                    summary = await self.generate_summary(messages, group_id)
+                    await self.send_summary(group_id, summary)
+                    self.message_buffer.clear(group_id)  # 清空内存中的消息
                 else:
                     # 如果内存中的消息不足，尝试从文件加载最近的消息
-                    last_summary_time = self.last_summary_time[msg.group_id]
-                    recent_messages = await self.load_recent_messages(msg.group_id, days=7, after_timestamp=last_summary_time)
+                    last_summary_time = self.last_summary_time.get(group_id, 0.0)
+                    recent_messages = await self.load_recent_messages(group_id, days=7, after_timestamp=last_summary_time)
                     if len(recent_messages) >= self.config["min_messages"]:
-                        summary = await self.generate_summary(recent_messages, msg.group_id)
-                        await self.send_summary(msg.group_id, summary)
+                        summary = await self.generate_summary(recent_messages, group_id)
+                        await self.send_summary(group_id, summary)
                     else:
                         await msg.reply(text=f"自上次总结后消息数量不足 {self.config['min_messages']} 条，无法生成总结")
             else:
@@ -465,12 +696,12 @@ class DailySummaryPlugin(BasePlugin):
         """预加载群组的最近消息"""
         try:
             # 获取上次总结时间
-            last_time = self.last_summary_time[group_id]
+            last_time = self.last_summary_time.get(group_id, 0.0)
             if last_time > 0:
                 # 加载上次总结后的消息
                 recent_messages = await self.load_recent_messages(group_id, days=7, after_timestamp=last_time)
                 if recent_messages:
-                    self.message_store[group_id] = recent_messages
+                    self.message_buffer.load(group_id, recent_messages, last_time)
                     print(f"已为群组 {group_id} 预加载 {len(recent_messages)} 条消息记录")
         except Exception as e:
             print(f"预加载群组 {group_id} 的消息记录时出错: {str(e)}") 
\ No newline at end of file
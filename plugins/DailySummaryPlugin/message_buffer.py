@@ -0,0 +1,84 @@
+import sys
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, List
+
+from .records import MessageRecord
+
+# 一条消息记录除正文外的大致内存占用（对象本身、时间戳和 deque 中的指针；用户 id 和昵称是共享的）
+_RECORD_OVERHEAD = 100
+
+
+def record_size(record: MessageRecord) -> int:
+    """估算一条消息记录占用的内存（字节）"""
+    return _RECORD_OVERHEAD + sys.getsizeof(record.content)
+
+
+class MessageBuffer:
+    """按群保存最近消息的有界环形缓冲区
+
+    每个群最多保留 capacity 条，所有群合计不超过 budget 字节（估算值）；
+    超出时从最久没有新消息的群开始丢弃最旧的记录。所有消息都已由 MessageLogWriter 写入日志，
+    丢弃只是"溢出到磁盘"：每个群记录被丢弃记录中最新的时间戳（水位），
+    需要更早的消息时 complete_after() 返回 False，由调用方从日志中读取。
+    """
+
+    def __init__(self, capacity: int = 5000, budget: int = 64 * 1024 * 1024):
+        self.capacity = capacity
+        self.budget = budget
+        self.size = 0
+        # 群号 -> 最近的消息，按最近一次收到消息的时间排列
+        self._groups: "OrderedDict[Hashable, Deque[MessageRecord]]" = OrderedDict()
+        self._spilled: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._groups.values())
+
+    def groups(self) -> List[Hashable]:
+        """所有收到过消息的群，包括消息已全部溢出的群"""
+        return list(dict.fromkeys([*self._groups, *self._spilled]))
+
+    def records(self, group_id: Hashable) -> List[MessageRecord]:
+        """群在内存中的消息（按时间顺序）"""
+        return list(self._groups.get(group_id, ()))
+
+    def complete_after(self, group_id: Hashable, timestamp: float) -> bool:
+        """时间戳大于 timestamp 的消息是否全部在内存中"""
+        return timestamp >= self._spilled.get(group_id, 0)
+
+    def append(self, group_id: Hashable, record: MessageRecord):
+        records = self._groups.get(group_id)
+        if records is None:
+            records = self._groups[group_id] = deque()
+        else:
+            self._groups.move_to_end(group_id)
+        records.append(record)
+        self.size += record_size(record)
+        if len(records) > self.capacity:
+            self._spill(group_id, records)
+        while self.size > self.budget and len(self._groups) > 0:
+            # 从最久没有新消息的群开始溢出
+            oldest_group = next(iter(self._groups))
+            self._spill(oldest_group, self._groups[oldest_group])
+
+    def _spill(self, group_id: Hashable, records: Deque[MessageRecord]):
+        record = records.popleft()
+        self.size -= record_size(record)
+        self._spilled[group_id] = max(self._spilled.get(group_id, 0), record.timestamp)
+        if not records:
+            del self._groups[group_id]
+
+    def load(self, group_id: Hashable, records: List[MessageRecord], after_timestamp: float):
+        """用从日志读取的 after_timestamp 之后的消息填充一个群（预加载）"""
+        self.clear(group_id)
+        self._spilled[group_id] = max(self._spilled.get(group_id, 0), after_timestamp)
+        for record in records:
+            self.append(group_id, record)
+
+    def clear(self, group_id: Hashable):
+        """清空一个群的内存消息（例如总结之后），被清掉的消息同样视为已溢出"""
+        records = self._groups.pop(group_id, None)
+        if not records:
+            return
+        for record in records:
+            self.size -= record_size(record)
+        self._spilled[group_id] = max(self._spilled.get(group_id, 0), records[-1].timestamp)
@@ -0,0 +1,248 @@
+"""总结用的提示词、token 估算和消息压缩"""
+import re
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Set
+
+from .records import MessageRecord
+
+SYSTEM_PROMPT = "你是一个专业的群聊总结助手，善于提取重要信息并做出简洁的总结。"
+
+SUMMARY_PROMPT = """请对以下群聊消息进行总结：
+
+{messages}
+
+请以时间段为基础，简洁地总结以下内容：
+1. 各个时间段内的主要讨论主题
+2. 谁与谁之间进行了哪些重要互动或讨论
+
+总结应当客观、全面，突出重点内容，忽略无意义的闲聊。总共在 200 字以内。
+"""
+
+# map 阶段：只总结一个时间段，结果还会再合并，所以保留细节而不是追求简短
+WINDOW_PROMPT = """以下是群聊在 {start} 至 {end} 之间的消息：
+
+{messages}
+
+请列出这段时间内的主要讨论主题，以及谁与谁之间进行了哪些重要互动或讨论。
+忽略无意义的闲聊，只输出要点，不超过 {max_chars} 字。
+"""
+
+# reduce 阶段：合并各时间段的要点
+REDUCE_PROMPT = """以下是同一个群聊按时间段整理的讨论要点：
+
+{partials}
+
+请以时间段为基础，简洁地总结以下内容：
+1. 各个时间段内的主要讨论主题
+2. 谁与谁之间进行了哪些重要互动或讨论
+
+总结应当客观、全面，突出重点内容，忽略无意义的闲聊。总共在 200 字以内。
+"""
+
+# 合并中间结果（要点太多、一次放不下时）
+MERGE_PROMPT = """以下是同一个群聊按时间段整理的讨论要点：
+
+{partials}
+
+请把它们合并为一份按时间段排列的要点，保留主要讨论主题和重要互动，不超过 {max_chars} 字。
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数：中日韩字符按每字 1 个，其他字符按每 4 个 1 个
+
+    不依赖具体模型的分词器，估算偏大，用来控制提示词长度足够了。
+    """
+    wide = sum(1 for char in text if ord(char) >= 0x2E80)
+    return wide + (len(text) - wide + 3) // 4
+
+
+# CQ 码：图片、表情等换成简短的占位符，其余（回复、戳一戳等）直接去掉
+_CQ_RE = re.compile(r"\[CQ:([A-Za-z_]+)((?:,[^\]]*)?)\]")
+_CQ_PLACEHOLDERS = {
+    "image": "[图片]", "face": "[表情]", "mface": "[表情]", "record": "[语音]", "video": "[视频]",
+    "file": "[文件]", "json": "[卡片]", "xml": "[卡片]", "share": "[链接]", "forward": "[聊天记录]",
+}
+_CQ_QQ_RE = re.compile(r"qq=(\w+)")
+# 只剩占位符的消息（单独的图片、表情）对总结没有帮助
+_PLACEHOLDER_ONLY_RE = re.compile(r"^(?:\[[^\]]{1,4}\]\s*)+$")
+
+# 每行消息前 "[HH:MM] " 时间的 token 数（估算值）
+_TIME_TOKENS = 4
+
+# 最终合并时每段要点至少保留的 token 数，再短就看不懂了
+_MIN_PARTIAL_TOKENS = 60
+
+
+class PromptLine(NamedTuple):
+    """压缩后提示词中的一行：第一条消息的时间和不含时间的文本"""
+    timestamp: int
+    text: str
+
+
+def strip_cq_codes(content: str) -> str:
+    def replace(match: "re.Match") -> str:
+        kind = match.group(1)
+        if kind == "at":
+            qq = _CQ_QQ_RE.search(match.group(2))
+            return f"@{qq.group(1)}" if qq else ""
+        return _CQ_PLACEHOLDERS.get(kind, "")
+    return " ".join(_CQ_RE.sub(replace, content).split())
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """文本的字符 n-gram 集合；比 n 还短的文本整体作为一个元素"""
+    text = text.lower()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """两个 shingle 集合的 Jaccard 相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def truncate(content: str, max_chars: int) -> str:
+    if max_chars <= 0 or len(content) <= max_chars:
+        return content
+    return f"{content[:max_chars]}…（以下省略 {len(content) - max_chars} 字）"
+
+
+def compact_messages(messages: List[MessageRecord], max_chars: int = 300,
+                     dedupe_threshold: float = 0.8) -> List[PromptLine]:
+    """把消息压缩成提示词的行
+
+    - 去掉 CQ 码，只剩图片、表情的消息直接丢弃
+    - 连续的相同或相似（字符 3-gram 的 Jaccard 相似度不低于 dedupe_threshold）消息合并为一行，
+      例如刷屏的 "+1"
+    - 超过 max_chars 字的消息截断
+    - 用户 id 只在第一次出现时写出，之后只写昵称（昵称重名的用户始终带上 id）
+    """
+    nickname_ids: Dict[str, Set] = {}
+    for msg in messages:
+        nickname_ids.setdefault(msg.nickname, set()).add(msg.user_id)
+
+    lines: List[PromptLine] = []
+    mentioned: Set = set()
+    # 正在合并的一组消息：[第一条的时间, 内容, shingle, 发言人标签列表, 发言人 id 集合, 条数]
+    current = None
+
+    def label(msg: MessageRecord) -> str:
+        if msg.user_id in mentioned and len(nickname_ids[msg.nickname]) == 1:
+            return msg.nickname
+        mentioned.add(msg.user_id)
+        return f"{msg.nickname}({msg.user_id})"
+
+    def emit():
+        timestamp, content, _, speakers, _, count = current
+        who = speakers[0] if len(speakers) == 1 else f"{'、'.join(speakers[:3])} 等 {len(speakers)} 人"
+        repeat = f"（×{count}）" if count > 1 else ""
+        lines.append(PromptLine(timestamp, f"{who}: {content}{repeat}"))
+
+    for msg in messages:
+        content = strip_cq_codes(msg.content)
+        if not content or _PLACEHOLDER_ONLY_RE.match(content):
+            continue
+        content = truncate(content, max_chars)
+        grams = shingles(content)
+        if current is not None and similarity(grams, current[2]) >= dedupe_threshold:
+            if msg.user_id not in current[4]:
+                current[3].append(label(msg))
+                current[4].add(msg.user_id)
+            current[5] += 1
+            continue
+        if current is not None:
+            emit()
+        current = [msg.timestamp, content, grams, [label(msg)], {msg.user_id}, 1]
+    if current is not None:
+        emit()
+    return lines
+
+
+def line_tokens(line: PromptLine) -> int:
+    return estimate_tokens(line.text) + _TIME_TOKENS
+
+
+def render_lines(lines: List[PromptLine]) -> str:
+    """把行拼成提示词中的消息部分：每行只写时分，日期变化时插入一行日期"""
+    output = []
+    current_date = None
+    for line in lines:
+        moment = datetime.fromtimestamp(line.timestamp)
+        date = moment.strftime('%Y-%m-%d')
+        if date != current_date:
+            output.append(f"—— {date} ——")
+            current_date = date
+        output.append(f"[{moment.strftime('%H:%M')}] {line.text}")
+    return "\n".join(output)
+
+
+def split_windows(lines: List[PromptLine], budget: int) -> List[List[PromptLine]]:
+    """把按时间排列的行切成连续的时间段，每段的 token 数不超过 budget（单行超过时独占一段）"""
+    windows: List[List[PromptLine]] = []
+    current: List[PromptLine] = []
+    used = 0
+    for line in lines:
+        tokens = line_tokens(line)
+        if current and used + tokens > budget:
+            windows.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += tokens
+    if current:
+        windows.append(current)
+    return windows
+
+
+def group_by_budget(texts: List[str], budget: int) -> List[List[str]]:
+    """把若干段文本按顺序分组，每组合计不超过 budget 个 token（单段超过时独占一组）"""
+    groups: List[List[str]] = []
+    used = 0
+    for text in texts:
+        tokens = estimate_tokens(text) + 2
+        if groups and used + tokens <= budget:
+            groups[-1].append(text)
+            used += tokens
+        else:
+            groups.append([text])
+            used = tokens
+    return groups
+
+
+def _truncation_cap(costs: List[int], budget: int) -> int:
+    """找到上限 cap，使各段 min(token 数, cap) 之和不超过 budget"""
+    remaining = budget
+    ordered = sorted(costs)
+    for i, cost in enumerate(ordered):
+        share = remaining // (len(ordered) - i)
+        if cost > share:
+            return share
+        remaining -= cost
+    return ordered[-1]
+
+
+def fit_to_budget(texts: List[str], budget: int, min_tokens: int = _MIN_PARTIAL_TOKENS) -> List[str]:
+    """截断若干段按时间排列的文本，使合计不超过 budget 个 token
+
+    较短的段保持原样，只把最长的几段按比例截断到同一个上限以内；
+    上限低于 min_tokens（截断后已经看不懂）时，先丢弃最早的段，只保留最近的内容。
+    """
+    costs = [estimate_tokens(text) + 2 for text in texts]
+    if not texts or sum(costs) <= budget:
+        return texts
+    cap = _truncation_cap(costs, budget)
+    while cap < min_tokens and len(texts) > 1:
+        texts, costs = texts[1:], costs[1:]
+        if sum(costs) <= budget:
+            return texts
+        cap = _truncation_cap(costs, budget)
+    fitted = []
+    for text, cost in zip(texts, costs):
+        if cost > cap:
+            # 留出 "…（以下省略 N 字）" 的位置
+            text = truncate(text, max(len(text) * (cap - 12) // cost, 1))
+        fitted.append(text)
+    return fitted
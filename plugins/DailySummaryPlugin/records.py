@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import Dict, Hashable, Union
+
+# 用户 id 和昵称的共享池，条目超过上限时整个清空：
+# 已有的记录仍引用原来的对象，只是之后的消息重新开始共享，池不会随见过的用户数无限增长
+# （不用 sys.intern：Python 3.12 起被 intern 的字符串不会释放）
+_pool: Dict[Hashable, Hashable] = {}
+_POOL_LIMIT = 65536
+
+
+def intern_value(value: Hashable) -> Hashable:
+    """同一个人的每条消息引用同一个 id/昵称对象，而不是各存一份"""
+    shared = _pool.get(value)
+    if shared is None:
+        if len(_pool) >= _POOL_LIMIT:
+            _pool.clear()
+        shared = _pool[value] = value
+    return shared
+
+
+def format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class MessageRecord:
+    """一条群消息记录
+
+    相比原来的五键字典：用 __slots__ 省去每条记录的 __dict__，user_id 和昵称共享同一个对象，
+    formatted_time 不再保存，需要时由时间戳计算。
+    为兼容按字典使用记录的旧代码，仍支持 record["timestamp"] 和 record.get("nickname") 形式的读取。
+    """
+
+    __slots__ = ("timestamp", "user_id", "nickname", "content")
+
+    def __init__(self, timestamp: int, user_id: Union[int, str], nickname: str, content: str):
+        self.timestamp = timestamp
+        self.user_id = intern_value(user_id)
+        self.nickname = intern_value(nickname)
+        self.content = content
+
+    @property
+    def formatted_time(self) -> str:
+        return format_time(self.timestamp)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MessageRecord":
+        """从日志中的 JSON 对象创建记录，忽略其中的 formatted_time"""
+        return cls(data["timestamp"], data.get("user_id", ""), data.get("nickname", ""), data.get("content", ""))
+
+    def to_dict(self) -> Dict:
+        """日志中的格式，与旧版本写入的记录相同"""
+        return {
+            "user_id": self.user_id,
+            "nickname": self.nickname,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "formatted_time": self.formatted_time,
+        }
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, MessageRecord):
+            return NotImplemented
+        return (self.timestamp, self.user_id, self.nickname, self.content) == \
+            (other.timestamp, other.user_id, other.nickname, other.content)
+
+    def __hash__(self) -> int:
+        return hash((self.timestamp, self.user_id, self.nickname, self.content))
+
+    def __repr__(self) -> str:
+        return f"MessageRecord({self.timestamp}, {self.user_id!r}, {self.nickname!r}, {self.content!r})"
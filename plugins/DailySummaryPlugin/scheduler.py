@@ -0,0 +1,118 @@
+import time
+import heapq
+import asyncio
+import zlib
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+# 任务函数可以返回下次运行的时间，返回 None 时按固定间隔
+Job = Callable[[], Awaitable[Optional[float]]]
+
+
+def stagger_offset(key: Hashable, window: float) -> float:
+    """按键的哈希在 [0, window) 内取一个固定偏移，同一个群每次启动都落在同一位置"""
+    if window <= 0:
+        return 0.0
+    return zlib.crc32(str(key).encode("utf-8")) % 10000 / 10000 * window
+
+
+class JobScheduler:
+    """在事件循环中运行的周期任务调度器
+
+    用最小堆按下次运行时间排列所有任务（每个群的自动总结、定期保存、日志归档），
+    后台任务只在最早的任务到期时醒来；到期的任务各自在一个协程中运行，
+    limited 的任务（自动总结）同时运行的数量不超过 concurrency，避免多个群的 LLM 请求同时发出。
+    同一个任务运行结束后才会安排下一次，不会重叠运行。
+    """
+
+    def __init__(self, concurrency: int = 2):
+        self._heap: List[Tuple[float, int, Hashable]] = []  # (到期时间, 序号, 键)
+        self._jobs: Dict[Hashable, Tuple[Job, float, bool]] = {}  # 键 -> (任务, 间隔, 是否限制并发)
+        self._due: Dict[Hashable, float] = {}
+        self._running: Dict[Hashable, asyncio.Task] = {}
+        self._seq = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._jobs
+
+    def every(self, key: Hashable, interval: float, job: Job, first_due: Optional[float] = None,
+              limited: bool = False):
+        """注册一个每隔 interval 秒运行一次的任务，第一次在 first_due（默认一个间隔之后）运行"""
+        self._jobs[key] = (job, interval, limited)
+        self._schedule(key, time.time() + interval if first_due is None else first_due)
+
+    def _schedule(self, key: Hashable, due: float):
+        self._due[key] = due
+        self._seq += 1
+        if not self._heap or due < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (due, self._seq, key))
+
+    def next_due(self, key: Hashable) -> Optional[float]:
+        return self._due.get(key)
+
+    def pop_due(self, now: float) -> List[Tuple[Hashable, float]]:
+        """取出所有已到期的任务，结果为 (键, 到期时间)"""
+        due_keys = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, key = heapq.heappop(self._heap)
+            # 被重新安排过的任务，堆里的旧条目直接丢弃
+            if self._due.get(key) == due:
+                del self._due[key]
+                due_keys.append((key, due))
+        return due_keys
+
+    async def _run_job(self, key: Hashable, due: float):
+        job, interval, limited = self._jobs[key]
+        next_due = None
+        try:
+            if limited:
+                async with self._semaphore:
+                    next_due = await job()
+            else:
+                next_due = await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"定时任务 {key} 执行出错: {str(e)}")
+        finally:
+            self._running.pop(key, None)
+        now = time.time()
+        if next_due is None or next_due <= now:
+            # 保持原来的相位（错开的偏移不变），错过的周期直接跳过
+            next_due = due + interval
+            if next_due <= now:
+                next_due += ((now - next_due) // interval + 1) * interval
+        if key in self._jobs and key not in self._due:
+            self._schedule(key, next_due)
+
+    async def _run(self):
+        while True:
+            for key, due in self.pop_due(time.time()):
+                if key in self._jobs and key not in self._running:
+                    self._running[key] = asyncio.create_task(self._run_job(key, due))
+            self._wakeup.clear()
+            timeout = max(self._heap[0][0] - time.time(), 0) if self._heap else None
+            # 不用 wait_for：它在等待刚好完成时会吞掉 cancel，导致 stop() 卡住
+            waiter = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=timeout)
+            finally:
+                waiter.cancel()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止调度并取消正在运行的任务"""
+        tasks = list(self._running.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._running.clear()
@@ -0,0 +1,447 @@
+"""LinkManager 基准测试
+
+生成 1k/10k/100k 条带中英文描述和标签的合成链接数据，测量各命令处理函数的 p50/p99 延迟和内存峰值，
+并用本地的模拟 HTTP 服务器（可配置延迟、失败率和宕机的站点数）测量链接检查。
+结果以 JSON 输出，可以用 --baseline 与之前版本的结果对比。
+另外用单个汉字逐一搜索，与子串匹配的结果比较，检查中文单字搜索有没有漏掉链接（cjk_char_recall）。
+
+在项目根目录执行：
+    python -m plugins.LinkManager.bench -o bench.json
+    python -m plugins.LinkManager.bench --sizes 1000,10000 --baseline bench.json
+
+插件直接在进程内创建（不连接 NapCat），消息发送由 BenchApi 代替；
+后台复查和元数据抓取在测试期间关闭，不会访问外网。
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+from .main import LinkManagerPlugin
+from .search_index import contains_keyword
+from .shards import ShardManager
+from .transfer import import_batches
+
+BENCH_GROUP = "100000"
+CHECK_GROUP = "100001"
+
+_ZH_WORDS = [
+    "深度学习", "教程", "入门", "源码", "分析", "笔记", "总结", "面试", "算法", "数据结构", "操作系统",
+    "编译器", "分布式", "数据库", "索引", "缓存", "并发", "网络", "协议", "性能", "优化", "调试",
+    "部署", "容器", "微服务", "前端", "后端", "框架", "论文", "阅读", "推荐", "工具", "插件", "配置",
+]
+_EN_WORDS = [
+    "python", "rust", "golang", "linux", "kernel", "docker", "kubernetes", "react", "vue", "pytorch",
+    "transformer", "llm", "rag", "sql", "redis", "nginx", "git", "vim", "neovim", "shell", "async",
+    "compiler", "benchmark", "tutorial", "guide", "paper", "notes", "cheatsheet", "awesome", "list",
+]
+_TAGS = ["教程", "论文", "工具", "面试", "源码", "python", "rust", "AI", "系统", "网络", "数据库", "前端", "新闻", "博客"]
+_DOMAINS = [
+    "github.com", "zhuanlan.zhihu.com", "blog.csdn.net", "juejin.cn", "arxiv.org", "stackoverflow.com",
+    "medium.com", "www.bilibili.com", "docs.python.org", "developer.mozilla.org", "news.ycombinator.com",
+]
+
+
+class BenchApi:
+    """代替 NapCat 的消息接口，只计数不发送"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def post_group_msg(self, *args, **kwargs):
+        self.sent += 1
+
+    async def post_private_msg(self, *args, **kwargs):
+        self.sent += 1
+
+    async def send_group_forward_msg(self, *args, **kwargs):
+        self.sent += 1
+
+    async def send_private_forward_msg(self, *args, **kwargs):
+        self.sent += 1
+
+
+def make_message(raw: str, group_id: str = BENCH_GROUP, user_id: str = "10001") -> SimpleNamespace:
+    """构造处理函数用到的消息字段"""
+    return SimpleNamespace(
+        raw_message=raw,
+        group_id=group_id,
+        user_id=user_id,
+        self_id="10000",
+        sender=SimpleNamespace(user_id=user_id, nickname=f"用户{user_id}"),
+    )
+
+
+class Corpus:
+    """可复现的合成链接数据"""
+
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+
+    def words(self, count: int) -> List[str]:
+        return [self.random.choice(_ZH_WORDS if self.random.random() < 0.5 else _EN_WORDS) for _ in range(count)]
+
+    def description(self) -> str:
+        return " ".join(self.words(self.random.randint(4, 16)))
+
+    def url(self, i: int) -> str:
+        domain = self.random.choice(_DOMAINS)
+        return f"https://{domain}/{'/'.join(self.words(2))}/{i}"
+
+    def tags(self) -> List[str]:
+        return self.random.sample(_TAGS, self.random.randint(0, 3))
+
+    def record(self, i: int, group_id: str) -> Dict:
+        return {
+            "url": self.url(i),
+            "group_id": group_id,
+            "creator_id": str(10000 + i % 500),
+            "creator_name": f"用户{i % 500}",
+            "created_at": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} 12:00:00",
+            "tags": self.tags(),
+            "descriptions": [{
+                "content": self.description(),
+                "user_id": str(10000 + (i + k) % 500),
+                "username": f"用户{(i + k) % 500}",
+                "timestamp": "2024-01-01 12:00:00",
+            } for k in range(self.random.randint(0, 3))],
+        }
+
+    def typo(self, word: str) -> str:
+        """删掉一个字符，模拟拼写错误"""
+        if len(word) < 4:
+            return word
+        i = self.random.randrange(1, len(word) - 1)
+        return word[:i] + word[i + 1:]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """延迟统计，单位毫秒"""
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+    }
+
+
+async def measure(op: Callable[[int], Awaitable], iterations: int, memory_iterations: int) -> Dict:
+    """先测延迟，再在 tracemalloc 下单独测每次调用的内存峰值（避免 tracemalloc 影响计时）"""
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await op(i)
+        samples.append(time.perf_counter() - start)
+    result = summarize(samples)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(iterations, iterations + memory_iterations):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            await op(i)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - baseline)
+    finally:
+        tracemalloc.stop()
+    result["peak_kb"] = round(max(peaks) / 1024, 1) if peaks else 0
+    return result
+
+
+async def create_plugin() -> LinkManagerPlugin:
+    """在当前目录下创建插件实例，关闭会访问外网或影响计时的后台任务"""
+    plugin = LinkManagerPlugin.__new__(LinkManagerPlugin)
+    plugin.api = BenchApi()
+    await plugin.on_load()
+    await plugin.scheduler.stop()
+    await plugin.enricher.close()
+    plugin.enricher.submit = lambda key, url: None
+    plugin.notify_sender.interval = 0
+    return plugin
+
+
+async def write_corpus(size: int, corpus: Corpus, directory: str) -> float:
+    """把合成数据写入分片文件，返回耗时（秒）"""
+    start = time.perf_counter()
+    shards = ShardManager(directory)
+    records = (corpus.record(i, BENCH_GROUP) for i in range(size))
+    for touched, _, _, _ in import_batches(shards, records, batch_size=5000):
+        for shard in touched.values():
+            shard.mark_dirty()
+    await shards.close()
+    return time.perf_counter() - start
+
+
+def check_cjk_char_recall(links: List[Dict], search: Callable[[str], List[Dict]]) -> Dict:
+    """用语料中的每个汉字搜索，统计子串匹配能找到、搜索却漏掉的链接数"""
+    chars = sorted({char for word in _ZH_WORDS for char in word})
+    missed = {}
+    for char in chars:
+        found = {link["id"] for link in search(char)}
+        count = sum(1 for link in links if contains_keyword(link, char) and link["id"] not in found)
+        if count:
+            missed[char] = count
+    if missed:
+        print(f"单字搜索漏掉了链接：{missed}", file=sys.stderr)
+    return {"queries": len(chars), "missed": sum(missed.values()), "missed_chars": sorted(missed)}
+
+
+async def bench_corpus(size: int, args, corpus: Corpus) -> Dict:
+    """对一个规模的数据集测量各命令"""
+    result: Dict = {"size": size}
+    result["generate_s"] = round(await write_corpus(size, corpus, "data/links"), 3)
+
+    # 冷启动后第一次访问该群：读取文件并建立索引
+    start = time.perf_counter()
+    shards = ShardManager("data/links")
+    shards.get(BENCH_GROUP)
+    result["cold_load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    del shards
+
+    # 一个群的数据及其索引常驻内存的大小
+    tracemalloc.start()
+    shards = ShardManager("data/links")
+    shards.get(BENCH_GROUP)
+    result["shard_memory_mb"] = round(tracemalloc.get_traced_memory()[0] / 1024 / 1024, 1)
+    tracemalloc.stop()
+    del shards
+
+    plugin = await create_plugin()
+    try:
+        links = plugin.read_links(BENCH_GROUP)
+        existing_urls = [corpus.random.choice(links)["url"] for _ in range(64)]
+        queries = [" ".join(corpus.words(corpus.random.randint(1, 2))) for _ in range(64)]
+        typos = [corpus.typo(corpus.random.choice(_EN_WORDS)) for _ in range(64)]
+        chars = [corpus.random.choice(corpus.random.choice(_ZH_WORDS)) for _ in range(64)]
+        result["cjk_char_recall"] = check_cjk_char_recall(
+            links, lambda char: plugin.search_links(char, BENCH_GROUP))
+
+        async def add(i):
+            await plugin.handle_add_command(make_message(
+                f'/add {corpus.url(size + i)} -d "{corpus.description()}" -t {",".join(corpus.tags()) or "新闻"}'))
+
+        async def add_existing(i):
+            await plugin.handle_add_command(make_message(
+                f'/add {existing_urls[i % 64]} -d "{corpus.description()}" -a', user_id=str(20000 + i)))
+
+        async def search(i):
+            await plugin.handle_search_command(make_message(f"/search {queries[i % 64]}"))
+
+        async def search_tags(i):
+            await plugin.handle_search_command(make_message(f"/search {queries[i % 64]} -t {_TAGS[i % len(_TAGS)]}"))
+
+        async def search_fuzzy(i):
+            await plugin.handle_search_command(make_message(f"/search {typos[i % 64]}"))
+
+        async def search_char(i):
+            await plugin.handle_search_command(make_message(f"/search {chars[i % 64]}"))
+
+        async def search_page(i):
+            await plugin.handle_search_command(make_message(f"/search {_EN_WORDS[i % len(_EN_WORDS)]} -p 3"))
+
+        async def view(i):
+            await plugin.handle_view_command(make_message(f"/view {existing_urls[i % 64]}"))
+
+        async def tags(i):
+            await plugin.handle_tags_command(make_message("/tags"))
+
+        operations = {
+            "add_new": add,
+            "add_existing": add_existing,
+            "search": search,
+            "search_with_tag": search_tags,
+            "search_fuzzy": search_fuzzy,
+            "search_cjk_char": search_char,
+            "search_page_3": search_page,
+            "view": view,
+            "tags": tags,
+        }
+        result["ops"] = {}
+        for name, op in operations.items():
+            result["ops"][name] = await measure(op, args.iterations, args.memory_iterations)
+    finally:
+        await plugin.on_unload()
+    return result
+
+
+class StandInServer:
+    """模拟外部站点：每个端口相当于一个域名，可配置延迟、失败率和完全无响应的站点数"""
+
+    def __init__(self, hosts: int, latency: float, failure_rate: float, down_hosts: int, seed: int = 0):
+        self.hosts = hosts
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.down_hosts = down_hosts
+        self.random = random.Random(seed)
+        self.ports: List[int] = []
+        self.requests = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._stopping = asyncio.Event()
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        port = request.transport.get_extra_info("sockname")[1]
+        if self.ports.index(port) < self.down_hosts:
+            # 不响应，直到服务器停止（否则 cleanup 会一直等这些请求结束）
+            await self._stopping.wait()
+            return web.Response(status=503)
+        await asyncio.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            return web.Response(status=404)
+        return web.Response(text="ok")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app, handle_signals=False)
+        await self._runner.setup()
+        for _ in range(self.hosts):
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            await site.start()
+            self.ports.append(site._server.sockets[0].getsockname()[1])
+
+    async def stop(self):
+        self._stopping.set()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def bench_checker(args, corpus: Corpus) -> Dict:
+    """测量 check_links：链接分布在多个模拟站点上，其中 down_hosts 个站点不响应"""
+    server = StandInServer(args.hosts, args.latency / 1000, args.failure_rate, args.down_hosts)
+    await server.start()
+    plugin = await create_plugin()
+    plugin.checker.timeout = args.check_timeout
+    try:
+        keys = []
+        for i in range(args.check_links):
+            port = server.ports[i % len(server.ports)]
+            plugin.add_link(f"http://127.0.0.1:{port}/link/{i}", "10001", "用户", CHECK_GROUP, corpus.description())
+        shard = plugin.shards.get(CHECK_GROUP)
+        keys = [(shard.key, link["id"]) for link in shard.links]
+
+        start = time.perf_counter()
+        await plugin.check_links(keys)
+        elapsed = time.perf_counter() - start
+        statuses: Dict[str, int] = {}
+        for link in shard.links:
+            status = link.get("status_message", "")
+            status = "域名无法访问" if status.startswith("域名无法访问") else status
+            statuses[status] = statuses.get(status, 0) + 1
+        return {
+            "links": len(keys),
+            "hosts": args.hosts,
+            "down_hosts": args.down_hosts,
+            "latency_ms": args.latency,
+            "failure_rate": args.failure_rate,
+            "timeout_s": args.check_timeout,
+            "elapsed_s": round(elapsed, 3),
+            "links_per_s": round(len(keys) / elapsed, 1),
+            "requests": server.requests,
+            "statuses": statuses,
+        }
+    finally:
+        await plugin.on_unload()
+        await server.stop()
+
+
+def compare(result: Dict, baseline: Dict):
+    """打印与基准结果相比的变化（p50/p99 延迟）"""
+    old_sizes = {item["size"]: item for item in baseline.get("corpora", [])}
+    for item in result["corpora"]:
+        old = old_sizes.get(item["size"])
+        if old is None:
+            continue
+        print(f"\n规模 {item['size']}：")
+        for name, stats in item["ops"].items():
+            old_stats = old.get("ops", {}).get(name)
+            if not old_stats:
+                continue
+            changes = []
+            for field in ("p50_ms", "p99_ms"):
+                before, after = old_stats[field], stats[field]
+                ratio = after / before if before else float("inf")
+                changes.append(f"{field} {before} -> {after} ({ratio:.2f}x)")
+            print(f"  {name:16s} " + "  ".join(changes))
+
+
+async def run(args) -> Dict:
+    corpus = Corpus(args.seed)
+    result = {
+        "plugin_version": LinkManagerPlugin.version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "corpora": [],
+    }
+    origin = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="linkmanager-bench-") as workdir:
+        try:
+            for size in args.sizes:
+                # 插件使用相对路径 data/...，每个规模使用独立的工作目录
+                directory = os.path.join(workdir, str(size))
+                os.makedirs(directory)
+                os.chdir(directory)
+                print(f"测试 {size} 条链接……", file=sys.stderr)
+                result["corpora"].append(await bench_corpus(size, args, corpus))
+            if args.check_links:
+                directory = os.path.join(workdir, "checker")
+                os.makedirs(directory)
+                os.chdir(directory)
+                print(f"测试检查 {args.check_links} 个链接……", file=sys.stderr)
+                result["checker"] = await bench_checker(args, corpus)
+        finally:
+            os.chdir(origin)
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m plugins.LinkManager.bench", description="LinkManager 基准测试")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="数据集规模，用逗号分隔")
+    parser.add_argument("--iterations", type=int, default=200, help="每个命令测量延迟的次数")
+    parser.add_argument("--memory-iterations", type=int, default=20, help="每个命令测量内存的次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--check-links", type=int, default=2000, help="链接检查测试的链接数，0 表示跳过")
+    parser.add_argument("--hosts", type=int, default=8, help="模拟站点数")
+    parser.add_argument("--down-hosts", type=int, default=1, help="其中完全无响应的站点数")
+    parser.add_argument("--latency", type=float, default=20, help="模拟站点的响应延迟（毫秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="模拟站点返回 404 的比例")
+    parser.add_argument("--check-timeout", type=float, default=2.0, help="链接检查超时时间（秒）")
+    parser.add_argument("-o", "--output", help="结果 JSON 文件，默认输出到标准输出")
+    parser.add_argument("--baseline", help="之前的结果 JSON 文件，打印延迟变化")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    result = asyncio.run(run(args))
+    payload = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, encoding="utf-8", mode="w") as f:
+            f.write(payload)
+        print(f"结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(payload)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8", mode="r") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
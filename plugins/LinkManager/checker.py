@@ -0,0 +1,250 @@
+import time
+import asyncio
+import aiohttp
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# 这些状态码通常表示服务器不支持 HEAD，需要改用 GET 再试一次
+_HEAD_REJECTED = {400, 403, 405, 501}
+
+# 这些状态码说明整个站点有问题（而不是单个页面），计入域名的连续失败次数
+_HOST_DOWN_STATUSES = {502, 503, 504}
+
+
+class HostBreaker:
+    """单个域名的熔断器
+
+    连续 threshold 次域名级失败（超时、连接失败、502/503/504）后断开，
+    cooldown 秒内该域名的链接不发请求，结果记为未检查；冷却结束后半开，只放行一个探测请求，
+    其余请求等待探测结果：成功则恢复，失败则重新断开。
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial: Optional[asyncio.Event] = None  # 半开探测进行中时不为 None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def cooling_down(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown
+
+    def record(self, host_down: bool):
+        if not host_down:
+            self.failures = 0
+            self.opened_at = None
+        else:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+        self.end_trial()
+
+    def end_trial(self):
+        """结束半开探测，唤醒等待结果的请求"""
+        trial, self.trial = self.trial, None
+        if trial is not None:
+            trial.set()
+
+
+class LinkChecker:
+    """并发链接检查器
+
+    所有请求共用一个带 DNS 缓存的连接池，避免每个链接重新握手；
+    同时限制全局并发数和单个域名的并发数，防止把对方站点打挂或被限流。
+
+    探测时优先发送 HEAD，服务器不支持时退回到只请求第一个字节的 GET；
+    若链接记录中保存了 ETag/Last-Modified，会带上条件请求头，未变化时服务器直接返回 304。
+    任何情况下读取的响应体都不超过 max_bytes。
+
+    每个域名有一个熔断器（见 HostBreaker），某个站点整体宕机时，
+    只有前几个链接会等到超时，其余链接不发请求，结果的"是否有效"为 None（未检查）。
+    """
+
+    def __init__(self, timeout: float, concurrency: int = 20, per_host: int = 4, dns_ttl: int = 300,
+                 max_bytes: int = 1024, breaker_threshold: int = 3, breaker_cooldown: float = 300):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.dns_ttl = dns_ttl
+        self.max_bytes = max_bytes
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._global_limit = asyncio.Semaphore(concurrency)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, HostBreaker] = {}  # 只保存最近有失败记录的域名
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话，首次使用时创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=self.per_host,
+                ttl_dns_cache=self.dns_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    @staticmethod
+    def _host_key(url: str) -> str:
+        """并发限制和熔断的粒度：域名加非默认端口"""
+        parts = urlsplit(url)
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        host = parts.hostname or ""
+        return f"{host}:{port}" if port else host
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return limit
+
+    def _breaker(self, host: str) -> HostBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = HostBreaker(self.breaker_threshold, self.breaker_cooldown)
+        return breaker
+
+    def _is_open(self, host: str) -> bool:
+        breaker = self._breakers.get(host)
+        return breaker is not None and breaker.is_open
+
+    async def _admit(self, host: str) -> Optional[bool]:
+        """判断能否向该域名发请求：返回 None 表示熔断中，否则返回本次请求是否为半开探测"""
+        while True:
+            breaker = self._breakers.get(host)
+            if breaker is None or not breaker.is_open:
+                return False
+            if breaker.trial is not None:
+                await breaker.trial.wait()
+                continue
+            if breaker.cooling_down():
+                return None
+            breaker.trial = asyncio.Event()
+            return True
+
+    def _record(self, host: str, host_down: bool):
+        if not host_down and host not in self._breakers:
+            return
+        breaker = self._breaker(host)
+        breaker.record(host_down)
+        if not breaker.failures:
+            # 恢复正常的域名不再保留记录
+            del self._breakers[host]
+
+    def retry_after(self, url: str) -> float:
+        """该链接的域名还要熔断多少秒，未熔断时为 0"""
+        breaker = self._breakers.get(self._host_key(url))
+        if breaker is None or breaker.opened_at is None:
+            return 0.0
+        return max(breaker.opened_at + breaker.cooldown - time.monotonic(), 0.0)
+
+    def open_hosts(self) -> List[str]:
+        """当前处于熔断状态的域名"""
+        return sorted(host for host, breaker in self._breakers.items() if breaker.is_open)
+
+    @staticmethod
+    def _conditional_headers(validators: Dict) -> Dict[str, str]:
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    @staticmethod
+    def _extract_validators(response: aiohttp.ClientResponse, validators: Dict) -> Dict:
+        """从响应头中提取新的缓存校验值，304 时沿用旧值"""
+        return {
+            "etag": response.headers.get("ETag") or validators.get("etag"),
+            "last_modified": response.headers.get("Last-Modified") or validators.get("last_modified"),
+        }
+
+    async def _drain(self, response: aiohttp.ClientResponse):
+        """最多读取 max_bytes 字节；还有剩余内容时直接断开连接，不下载完整响应体"""
+        await response.content.read(self.max_bytes)
+        if not response.content.at_eof():
+            response.close()
+
+    async def probe(self, url: str, validators: Optional[Dict] = None) -> Tuple[Optional[bool], str, Dict]:
+        """探测单个链接，返回 (是否有效, 状态信息, 缓存校验值)；域名熔断中没有发请求时"是否有效"为 None"""
+        validators = validators or {}
+        host = self._host_key(url)
+        while True:
+            is_trial = await self._admit(host)
+            if is_trial is None:
+                return None, f"域名无法访问（{host} 连续失败，暂停检查）", validators
+            try:
+                async with self._global_limit, self._host_limit(host):
+                    # 等待并发名额期间熔断器可能已经断开，回到外面重新判断（不能占着名额等待探测结果）
+                    if not is_trial and self._is_open(host):
+                        continue
+                    is_valid, status_message, new_validators, host_down = await self._request(url, validators)
+            except asyncio.CancelledError:
+                # 半开探测被取消时交还探测名额，否则等待的请求会一直挂起
+                if is_trial and host in self._breakers:
+                    self._breakers[host].end_trial()
+                raise
+            self._record(host, host_down)
+            return is_valid, status_message, new_validators
+
+    async def _request(self, url: str, validators: Dict) -> Tuple[bool, str, Dict, bool]:
+        """发出探测请求，返回 (是否有效, 状态信息, 缓存校验值, 是否为域名级失败)"""
+        headers = self._conditional_headers(validators)
+        session = self._get_session()
+        try:
+            async with session.head(url, headers=headers, allow_redirects=True) as response:
+                status = response.status
+                new_validators = self._extract_validators(response, validators)
+            if status in _HEAD_REJECTED:
+                ranged_headers = dict(headers, Range="bytes=0-0")
+                async with session.get(url, headers=ranged_headers, allow_redirects=True) as response:
+                    status = response.status
+                    new_validators = self._extract_validators(response, validators)
+                    await self._drain(response)
+            if status == 304:
+                return True, "HTTP状态码: 304（未修改）", new_validators, False
+            return status < 400, f"HTTP状态码: {status}", new_validators, status in _HOST_DOWN_STATUSES
+        except asyncio.TimeoutError:
+            return False, "请求超时", validators, True
+        except (aiohttp.ClientConnectionError, OSError) as e:
+            return False, str(e), validators, True
+        except Exception as e:
+            return False, str(e), validators, False
+
+    async def check(self, url: str) -> Tuple[Optional[bool], str]:
+        """检查单个链接是否有效，域名熔断中时为 None"""
+        is_valid, status_message, _ = await self.probe(url)
+        return is_valid, status_message
+
+    async def check_many(self, links: List[Dict]) -> AsyncIterator[Tuple[Dict, Optional[bool], str, Dict]]:
+        """并发检查一批链接，按完成顺序逐个返回 (链接, 是否有效, 状态信息, 缓存校验值)"""
+        async def check_one(link: Dict) -> Tuple[Dict, Optional[bool], str, Dict]:
+            is_valid, status_message, validators = await self.probe(link["url"], link)
+            return link, is_valid, status_message, validators
+
+        tasks = [asyncio.create_task(check_one(link)) for link in links]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # 调用方提前退出时取消剩余的检查
+            for task in tasks:
+                task.cancel()
+            self._host_limits = {host: limit for host, limit in self._host_limits.items() if limit.locked()}
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,234 @@
+import re
+import time
+import asyncio
+import aiohttp
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from .urls import canonicalize_url
+
+# 只需要 <head> 中的内容，读到这里就可以停止
+_HEAD_END_RE = re.compile(rb"</head\s*>|<body[\s>]", re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([A-Za-z0-9_-]+)""", re.IGNORECASE)
+
+# 标题和描述的最大长度，避免个别页面把大段文本塞进索引
+_MAX_TITLE_LENGTH = 200
+_MAX_DESCRIPTION_LENGTH = 500
+
+
+class _MetadataParser(HTMLParser):
+    """从 HTML 中提取 <title>、描述和 canonical 链接"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.og_title = ""
+        self.description = ""
+        self.og_description = ""
+        self.canonical = ""
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name.lower(): value or "" for name, value in attrs}
+        if tag == "title":
+            self._in_title = True
+        elif tag == "meta":
+            name = (attrs.get("property") or attrs.get("name") or "").lower()
+            content = attrs.get("content", "").strip()
+            if name == "og:title":
+                self.og_title = self.og_title or content
+            elif name == "og:description":
+                self.og_description = self.og_description or content
+            elif name == "description":
+                self.description = self.description or content
+        elif tag == "link" and "canonical" in attrs.get("rel", "").lower().split():
+            self.canonical = self.canonical or attrs.get("href", "").strip()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def parse_metadata(html: str) -> Dict[str, str]:
+    """解析页面元数据，返回 {"title", "description", "canonical_url"}，缺失的字段为空字符串"""
+    parser = _MetadataParser()
+    try:
+        parser.feed(html)
+    except Exception:
+        # 截断的或不规范的 HTML，保留已解析出的部分
+        pass
+    title = " ".join((parser.og_title or parser.title).split())
+    description = " ".join((parser.og_description or parser.description).split())
+    return {
+        "title": title[:_MAX_TITLE_LENGTH],
+        "description": description[:_MAX_DESCRIPTION_LENGTH],
+        "canonical_url": parser.canonical,
+    }
+
+
+class MetadataCache:
+    """按规范化 URL 缓存页面元数据，条目 ttl 秒后过期，超过 max_entries 时淘汰最久未用的"""
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 2048):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # URL -> (过期时间, 元数据)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[Dict[str, str]]:
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        expires, metadata = entry
+        if expires < time.monotonic():
+            del self._entries[url]
+            return None
+        self._entries.move_to_end(url)
+        return metadata
+
+    def put(self, url: str, metadata: Dict[str, str], ttl: Optional[float] = None):
+        """缓存元数据，ttl 为 None 时使用默认有效期"""
+        self._entries[url] = (time.monotonic() + (self.ttl if ttl is None else ttl), metadata)
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class MetadataEnricher:
+    """后台抓取链接的页面标题、描述和 canonical 链接
+
+    submit() 只把任务放进队列，立即返回；固定数量的工作协程并发抓取，
+    每个请求有超时，且最多读取 max_bytes 字节（读到 </head> 即停止），慢站点不会长期占用工作协程。
+    结果按规范化 URL 缓存，同一链接重复添加或在多个群中分享时不会重复抓取；
+    抓取失败（超时、出错、4xx/5xx、非 HTML 页面）时缓存空结果 failure_ttl 秒，之后再重试。
+    同一 URL 正在抓取时，其他任务直接等待这次抓取的结果。
+    """
+
+    def __init__(self, on_result: Callable[[Hashable, Dict[str, str]], Awaitable[None]],
+                 workers: int = 4, timeout: float = 5.0, max_bytes: int = 65536,
+                 cache_ttl: float = 86400, queue_size: int = 1000, failure_ttl: float = 600):
+        self.on_result = on_result
+        self.failure_ttl = failure_ttl
+        self.workers = workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.cache = MetadataCache(cache_ttl)
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._pending: Set[Hashable] = set()
+        self._inflight: Dict[str, asyncio.Future] = {}  # 规范化 URL -> 正在进行的抓取
+        self._tasks = []
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.workers, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Accept": "text/html,application/xhtml+xml"},
+            )
+        return self._session
+
+    def full(self) -> bool:
+        """队列是否已满（已满时 submit 会丢弃任务）"""
+        return self._queue.full()
+
+    def submit(self, key: Hashable, url: str):
+        """提交一个抓取任务，结果通过 on_result(key, 元数据) 回调；队列已满时丢弃"""
+        if key in self._pending:
+            return
+        try:
+            self._queue.put_nowait((key, url))
+        except asyncio.QueueFull:
+            print(f"元数据抓取队列已满，跳过: {url}")
+            return
+        self._pending.add(key)
+        self.start()
+
+    async def fetch(self, url: str) -> Dict[str, str]:
+        """抓取并解析一个页面的元数据（优先使用缓存），失败时返回空字典"""
+        cache_key = canonicalize_url(url)
+        metadata = self.cache.get(cache_key)
+        if metadata is not None:
+            return metadata
+        inflight = self._inflight.get(cache_key)
+        if inflight is None:
+            inflight = self._inflight[cache_key] = asyncio.ensure_future(self._fetch_uncached(url, cache_key))
+            inflight.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        return await asyncio.shield(inflight)
+
+    async def _fetch_uncached(self, url: str, cache_key: str) -> Dict[str, str]:
+        try:
+            async with self._get_session().get(url, allow_redirects=True) as response:
+                if response.status >= 400 or "html" not in response.content_type:
+                    metadata = {}
+                else:
+                    head = await self._read_head(response)
+                    metadata = parse_metadata(head.decode(self._charset(response, head), errors="replace"))
+        except asyncio.TimeoutError:
+            print(f"抓取链接元数据超时: {url}")
+            metadata = {}
+        except Exception as e:
+            print(f"抓取链接元数据失败 {url}: {e}")
+            metadata = {}
+        # 失败和非 HTML 页面的空结果也缓存一段较短的时间，避免反复请求
+        self.cache.put(cache_key, metadata, None if metadata else self.failure_ttl)
+        return metadata
+
+    async def _read_head(self, response: aiohttp.ClientResponse) -> bytes:
+        """读取响应体直到 </head> 或 max_bytes，之后直接断开连接"""
+        data = bytearray()
+        while len(data) < self.max_bytes:
+            chunk = await response.content.read(min(8192, self.max_bytes - len(data)))
+            if not chunk:
+                break
+            data += chunk
+            if _HEAD_END_RE.search(data, max(len(data) - len(chunk) - 16, 0)):
+                break
+        if not response.content.at_eof():
+            response.close()
+        return bytes(data)
+
+    @staticmethod
+    def _charset(response: aiohttp.ClientResponse, head: bytes) -> str:
+        if response.charset:
+            return response.charset
+        match = _META_CHARSET_RE.search(head)
+        return match.group(1).decode("ascii") if match else "utf-8"
+
+    async def _worker(self):
+        while True:
+            key, url = await self._queue.get()
+            try:
+                metadata = await self.fetch(url)
+                if metadata:
+                    await self.on_result(key, metadata)
+            except Exception as e:
+                print(f"处理链接元数据失败 {url}: {e}")
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
+
+    def start(self):
+        """启动工作协程（首次提交任务时自动调用）"""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def close(self):
+        """停止工作协程并关闭连接池，队列中未处理的任务直接丢弃"""
+        tasks = self._tasks + list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._pending.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -1,11 +1,13 @@
 import os
 import re
+import sys
 import json
+import time
 import asyncio
 import aiohttp
 import argparse
 from typing import Dict, List, Tuple, Any, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from ncatbot.plugin import BasePlugin, CompatibleEnrollment
 from ncatbot.core.message import GroupMessage, PrivateMessage
@@ -26,6 +28,17 @@ from ncatbot.core.element import (
     Video,         # 视频
     File,          # 文件
 )
+
+from .store import new_link_id
+from .shards import ShardManager
+from .search_index import contains_keyword, tokenize
+from .checker import LinkChecker
+from .scheduler import RecheckScheduler
+from .notifier import PacedSender, DeadLinkNotifier
+from .enricher import MetadataEnricher
+from .transfer import FORMATS, iter_links, filter_links, export_links, read_records, import_batches
+from .sitegen import SiteGenerator
+
 bot = CompatibleEnrollment  # 兼容回调函数注册器
 
 class LinkManagerPlugin(BasePlugin):
@@ -35,35 +48,118 @@ class LinkManagerPlugin(BasePlugin):
     async def on_load(self):
         """插件加载时执行的操作"""
         self.config = {
-            "links_file": "data/links.json",  # 存储在根目录的data文件夹中
+            "links_dir": "data/links",  # 按群分片存储，每个群一个文件，私聊链接在 private.json
+            "links_file": "data/links.json",  # 旧版单文件数据，启动时自动迁移到分片存储
+            "shard_idle_timeout": 1800,  # 分片空闲多久后移出内存（秒）
             "link_timeout": 10,  # 链接检查超时时间（秒）
-            "link_check_interval": 3600  # 链接检查间隔（秒）
+            "check_concurrency": 20,  # 链接检查的全局并发数
+            "check_per_host": 4,  # 同一域名的最大并发数
+            "probe_max_bytes": 1024,  # 检查链接时最多读取的响应体字节数
+            "breaker_threshold": 3,  # 同一域名连续失败多少次后暂停检查该域名
+            "breaker_cooldown": 300,  # 域名暂停检查的时间（秒），之后先试探一个链接
+            "link_check_interval": 3600,  # 链接检查间隔（秒），持续有效的链接会逐步拉长
+            "link_check_max_interval": 7 * 86400,  # 链接检查的最大间隔（秒）
+            "link_retry_interval": 600,  # 失效链接首次重试间隔（秒），之后指数退避
+            "link_check_jitter": 0.1,  # 检查间隔的随机抖动比例
+            "link_check_batch": 50,  # 后台每次最多检查的链接数
+            "notify_rate": 1.0,  # 失效通知的发送速率（条/秒）
+            "notify_retries": 3,  # 失效通知发送失败后的重试次数
+            "notify_digest_limit": 20,  # 每条失效通知摘要中最多列出的链接数
+            "flush_delay": 2.0,  # 修改后延迟落盘时间（秒），期间的多次修改合并写入
+            "enrich_workers": 4,  # 抓取页面标题等元数据的并发数
+            "enrich_timeout": 5,  # 抓取元数据的超时时间（秒）
+            "enrich_max_bytes": 65536,  # 抓取元数据时最多读取的字节数
+            "enrich_cache_ttl": 86400,  # 元数据缓存有效期（秒）
+            "enrich_failure_ttl": 600,  # 元数据抓取失败后多久内不再重试（秒）
+            "search_page_size": 10,  # 搜索结果每页条数
+            "search_page_max_chars": 1500,  # 每页搜索结果的最大字符数
+            "search_page_max_lines": 40,  # 每页搜索结果的最大行数
+            "search_forward_page_size": 30,  # 以合并转发发送时每页条数
+            "search_forward_max_chars": 1000,  # 合并转发中每条链接的最大字符数
+            "tags_top_n": 30,  # /tags 列出的标签数
+            "admin_ids": ["2130212584"],  # 可以使用 /export、/import 的管理员QQ号
+            "export_dir": "data/exports",  # /export 导出文件的目录
+            "import_batch_size": 1000,  # /import 每批合并的记录数
+            "site_dir": "data/site",  # /site 生成的静态网站目录
+            "site_format": "markdown"  # 静态网站页面格式：markdown 或 html
         }
+        
+        # 按群分片存储，某个群的数据在该群第一次使用时才加载
+        self.shards = ShardManager(
+            self.config["links_dir"],
+            self.config["flush_delay"],
+            self.config["shard_idle_timeout"],
+        )
+        migrated = self.shards.migrate_legacy(self.config["links_file"])
+        if migrated:
+            print(f"已将 {migrated} 条链接迁移到分片存储 {self.config['links_dir']}")
+        self.shards.start()
+        
+        # 链接检查器，所有检查共用一个连接池
+        self.checker = LinkChecker(
+            self.config["link_timeout"],
+            self.config["check_concurrency"],
+            self.config["check_per_host"],
+            max_bytes=self.config["probe_max_bytes"],
+            breaker_threshold=self.config["breaker_threshold"],
+            breaker_cooldown=self.config["breaker_cooldown"],
+        )
+        
+        # 新链接的页面标题、描述在后台抓取，不阻塞 /add 的回复
+        self.enricher = MetadataEnricher(
+            self.apply_metadata,
+            self.config["enrich_workers"],
+            self.config["enrich_timeout"],
+            self.config["enrich_max_bytes"],
+            self.config["enrich_cache_ttl"],
+            failure_ttl=self.config["enrich_failure_ttl"],
+        )
+        
+        # 静态网站生成器，保留在内存中以便增量生成
+        self.site_generator = SiteGenerator(self.config["site_dir"], self.config["site_format"])
+        self._site_lock = asyncio.Lock()  # 同一时间只进行一次生成
+        
+        # 失效通知按 (群, 创建者) 汇总后限速发送
+        self.notify_sender = PacedSender(self.config["notify_rate"], self.config["notify_retries"])
+        self.notifier = DeadLinkNotifier(self.api, self.notify_sender, self.config["notify_digest_limit"])
+        
+        # 后台按到期时间复查链接，调度键为 (分片名, 链接id)
+        self.scheduler = RecheckScheduler(
+            self.check_links,
+            self.config["link_check_interval"],
+            self.config["link_retry_interval"],
+            self.config["link_check_max_interval"],
+            self.config["link_check_jitter"],
+            self.config["link_check_batch"],
+            # 一轮到期的链接全部检查完后再发送失效通知，同一创建者只收到一条
+            on_sweep_end=self.notifier.flush,
+        )
+        # 只读取各分片的检查时间，不把分片留在内存；没有 next_check 的旧链接在一个检查周期内打散
+        for key in self.shards.keys():
+            for link_id, next_check in self.shards.peek_schedule(key):
+                self.scheduler.schedule((key, link_id), due=next_check, spread=self.config["link_check_interval"])
+        self.scheduler.start()
+        
         print(f"{self.name} 插件已加载")
         print(f"插件版本: {self.version}")
-        
-        # 确保数据目录存在
-        os.makedirs(os.path.dirname(self.config["links_file"]), exist_ok=True)
+        print(f"共 {len(self.shards.keys())} 个分片，{len(self.scheduler)} 条链接")
     
     async def on_unload(self):
         """插件卸载时执行的操作"""
-        print(f"{self.name} 插件已卸载")
+        await self.scheduler.stop()
+        await self.enricher.close()
+        await self.notify_sender.stop()
+        await self.checker.close()
+        await self.shards.close()
+        print(f"{self.name} 插件已卸载，数据已保存")
     
-    def read_links(self):
-        """读取链接数据"""
-        try:
-            with open(self.config["links_file"], encoding="utf-8", mode="r") as f:
-                return json.loads(f.read())
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+    def read_links(self, group_id: Optional[str] = None) -> List[Dict]:
+        """读取某个群（为 None 时为私聊）的链接数据，调用方修改后需调用 save_links"""
+        return self.shards.get(group_id).links
     
-    def save_links(self, links=None):
-        """保存链接数据"""
-        if links is None:
-            links = self.read_links()
-        os.makedirs(os.path.dirname(self.config["links_file"]), exist_ok=True)
-        with open(self.config["links_file"], encoding="utf-8", mode="w") as f:
-            f.write(json.dumps(links, ensure_ascii=False, indent=4))
+    def save_links(self, group_id: Optional[str] = None):
+        """保存某个群的链接数据（标记为已修改，由后台合并写入）"""
+        self.shards.get(group_id).mark_dirty()
     
     def is_valid_url(self, url):
         """检查是否是有效的URL"""
@@ -76,19 +172,19 @@ class LinkManagerPlugin(BasePlugin):
             r'(?:/?|[/?]\S+)$', re.IGNORECASE)
         return bool(url_pattern.match(url))
     
+    def find_link(self, url: str, group_id: Optional[str] = None) -> Optional[Dict]:
+        """在群对应的分片中按规范化URL查找链接"""
+        return self.shards.get(group_id).find(url)
+    
     def add_link(self, url: str, user_id: str, username: str, group_id: Optional[str] = None, 
                 description: str = "", tags: List[str] = None, append: bool = False,
                 update: bool = False) -> Tuple[bool, str]:
-        """添加或更新链接"""
-        links = self.read_links()
+        """添加或更新链接（写法不同但规范化后相同的 URL 视为同一链接）"""
+        shard = self.shards.get(group_id)
         tags = tags or []
         
         # 查找现有链接
-        existing_link = None
-        for link in links:
-            if link.get("url") == url:
-                existing_link = link
-                break
+        existing_link = shard.find(url)
         
         if existing_link:
             # 检查用户是否有该链接的描述
@@ -154,6 +250,7 @@ class LinkManagerPlugin(BasePlugin):
         else:
             # 添加新链接
             new_link = {
+                "id": new_link_id(),
                 "url": url,
                 "group_id": group_id,
                 "creator_id": user_id,
@@ -167,64 +264,117 @@ class LinkManagerPlugin(BasePlugin):
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 }] if description else []
             }
-            links.append(new_link)
+            shard.append(new_link)
+            existing_link = new_link
             message = "链接添加成功"
+            # 新链接尽快做一次检查
+            new_link["next_check"] = self.scheduler.schedule((shard.key, new_link["id"]), due=time.time())
+        
+        # 还没有页面元数据的链接，提交给后台抓取
+        if "meta" not in existing_link:
+            self.enricher.submit((shard.key, existing_link["id"]), existing_link["url"])
         
-        self.save_links(links)
+        shard.reindex(existing_link)
+        shard.mark_dirty(existing_link)
         return True, message
     
-    def search_links(self, keyword: str, group_id: Optional[str] = None, tag: Optional[str] = None) -> List[Dict]:
-        """搜索链接"""
-        links = self.read_links()
-        results = []
-        
-        for link in links:
-            # 如果指定了群号，则只搜索该群的链接
-            if group_id and link.get("group_id") != group_id:
-                continue
-                
-            # 如果指定了标签，检查标签是否匹配
-            if tag and tag not in link.get("tags", []):
-                continue
-                
-            # 搜索关键词
-            descriptions = link.get("descriptions", [])
-            desc_texts = [d["content"] for d in descriptions]
-            
-            if (keyword.lower() in link["url"].lower() or
-                any(keyword.lower() in desc.lower() for desc in desc_texts)):
-                results.append(link)
-                
-        return results
+    async def apply_metadata(self, key: Tuple[str, str], metadata: Dict[str, str]):
+        """把后台抓取到的页面元数据写回链接（键为 (分片名, 链接id)），并更新搜索索引"""
+        shard = self.shards.get_by_key(key[0])
+        link = shard.get(key[1])
+        if link is None:
+            return
+        link["meta"] = dict(metadata, fetched_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        shard.reindex(link)
+        shard.mark_dirty(link)
+    
+    def search_page(self, keyword: str, group_id: Optional[str] = None, tags: Optional[List[str]] = None,
+                    page: int = 1, page_size: int = 10, match_any: bool = False) -> Tuple[List[Dict], int]:
+        """在群对应的分片中分页搜索链接，结果按相关度（BM25）排序
+        
+        Args:
+            keyword: 关键词，为空时只按标签筛选，按添加时间倒序返回；没有可检索的词时按子串匹配
+            group_id: 群号，为 None 时搜索私聊链接
+            tags: 标签列表，默认需同时包含所有标签
+            page: 页码，从 1 开始
+            page_size: 每页条数
+            match_any: 为 True 时包含任一标签即可
+        
+        Returns:
+            (本页结果, 匹配总数)
+        """
+        shard = self.shards.get(group_id)
+        offset = (page - 1) * page_size
+        
+        # 标签筛选通过求倒排表的交集/并集完成
+        within = shard.tag_index.match(tags, match_any) if tags else None
+        
+        keyword = keyword.strip()
+        if not keyword:
+            if within is None:
+                end = max(len(shard.links) - offset, 0)
+                return shard.links[max(end - page_size, 0):end][::-1], len(shard.links)
+            results = sorted((shard.get(link_id) for link_id in within),
+                             key=lambda link: link.get("created_at", ""), reverse=True)
+            return results[offset:offset + page_size], len(results)
+        
+        if within is not None and not within:
+            return [], 0
+        if not tokenize(keyword):
+            # 关键词中没有可以检索的词，退回按子串匹配
+            candidates = shard.links if within is None else (shard.get(link_id) for link_id in within)
+            results = sorted((link for link in candidates if contains_keyword(link, keyword)),
+                             key=lambda link: link.get("created_at", ""), reverse=True)
+            return results[offset:offset + page_size], len(results)
+        results, total = shard.search_index.search_page(keyword, offset, page_size, within=within)
+        return [link for _, link in results], total
+    
+    def search_links(self, keyword: str, group_id: Optional[str] = None, tags: Optional[List[str]] = None,
+                     limit: Optional[int] = None, match_any: bool = False) -> List[Dict]:
+        """搜索链接，返回按相关度排序的前 limit 条（为 None 时返回全部）"""
+        page_size = limit if limit is not None else sys.maxsize
+        return self.search_page(keyword, group_id, tags, 1, page_size, match_any)[0]
+    
+    def list_tags(self, group_id: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """列出群内的标签及其链接数，按链接数降序"""
+        tag_index = self.shards.get(group_id).tag_index
+        return tag_index.top(len(tag_index) if limit is None else limit)
     
     def get_link_details(self, url: str, group_id: Optional[str] = None) -> Optional[Dict]:
         """获取链接的详细信息"""
-        links = self.read_links()
-        for link in links:
-            if link.get("url") == url and (group_id is None or link.get("group_id") == group_id):
-                # 添加状态信息到返回结果
-                status_info = ""
-                if not link.get("is_valid", True):
-                    status_info = f"\n状态: 失效\n失效时间: {link.get('invalid_since')}\n原因: {link.get('status_message')}"
-                link["status_info"] = status_info
-                return link
-        return None
+        link = self.find_link(url, group_id)
+        if link is None:
+            return None
+        # 添加状态信息到返回结果（使用副本，避免写回存储）
+        status_info = ""
+        if not link.get("is_valid", True):
+            status_info = f"\n状态: 失效\n失效时间: {link.get('invalid_since')}\n原因: {link.get('status_message')}"
+        meta = link.get("meta", {})
+        meta_info = "".join(f"\n{label}: {meta[field]}" for field, label in
+                            (("title", "页面标题"), ("description", "页面简介"), ("canonical_url", "规范链接"))
+                            if meta.get(field))
+        return dict(link, status_info=status_info, meta_info=meta_info)
     
-    async def check_link_validity(self, url: str) -> Tuple[bool, str]:
-        """检查链接是否有效"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=self.config["link_timeout"]) as response:
-                    return response.status < 400, f"HTTP状态码: {response.status}"
-        except asyncio.TimeoutError:
-            return False, "请求超时"
-        except Exception as e:
-            return False, str(e)
+    async def check_link_validity(self, url: str) -> Tuple[Optional[bool], str]:
+        """检查链接是否有效，域名熔断中没有检查时为 None"""
+        return await self.checker.check(url)
     
-    async def update_link_status(self, link: Dict, is_valid: bool, status_message: str):
+    async def update_link_status(self, link: Dict, is_valid: bool, status_message: str,
+                                 validators: Optional[Dict] = None):
         """更新链接状态"""
+        # 保存 ETag/Last-Modified，下次检查时发送条件请求
+        for key, value in (validators or {}).items():
+            if value:
+                link[key] = value
         link["last_checked"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         link["is_valid"] = is_valid
+        # 连续失败/成功次数决定下次检查的间隔
+        if is_valid:
+            link["fail_count"] = 0
+            link["ok_streak"] = link.get("ok_streak", 0) + 1
+        else:
+            link["fail_count"] = link.get("fail_count", 0) + 1
+            link["ok_streak"] = 0
         link["status_message"] = status_message
         if not is_valid and not link.get("invalid_since"):
             link["invalid_since"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -232,61 +382,78 @@ class LinkManagerPlugin(BasePlugin):
             link.pop("invalid_since", None)
     
     async def notify_creator(self, link: Dict):
-        """通知创建者链接失效"""
-        if not link.get("is_valid") and link.get("creator_id"):
-            # 构建消息链，包含@创建者和通知内容
-            message = MessageChain([
-                At(link["creator_id"]),  # @创建者
-                Text("\n您添加的链接已失效：\n"),
-                Text(f"URL: {link['url']}\n"),
-                Text(f"失效时间: {link.get('invalid_since')}\n"),
-                Text(f"状态: {link.get('status_message')}\n"),
-                Text("请检查并更新链接。")
-            ])
-            
-            try:
-                # 如果是群组链接，在群内发送通知
-                if link.get("group_id"):
-                    await self.api.post_group_msg(link["group_id"], rtf=message)
-                # 如果是私聊链接，发送私聊消息
-                else:
-                    await self.api.post_private_msg(link["creator_id"], rtf=message)
-            except Exception as e:
-                print(f"无法通知用户 {link['creator_id']}: {e}")
-                # 如果群发送失败，尝试私聊通知
-                if link.get("group_id"):
-                    try:
-                        private_message = MessageChain([
-                            Text(f"""您在群 {link['group_id']} 中添加的链接已失效：
-URL: {link['url']}
-失效时间: {link.get('invalid_since')}
-状态: {link.get('status_message')}
-请检查并更新链接。""")
-                        ])
-                        await self.api.post_private_msg(link["creator_id"], rtf=private_message)
-                    except Exception as e2:
-                        print(f"私聊通知也失败: {e2}")
+        """记录需要通知创建者的失效链接，检查周期结束时汇总发送"""
+        self.notifier.add(link)
     
-    async def check_all_links(self):
-        """检查所有链接的有效性"""
-        links = self.read_links()
-        for link in links:
-            # 检查链接是否需要验证（上次检查时间超过间隔）
-            last_checked = datetime.strptime(link.get("last_checked", "2000-01-01 00:00:00"), "%Y-%m-%d %H:%M:%S")
-            if datetime.now() - last_checked < timedelta(seconds=self.config["link_check_interval"]):
+    async def check_links(self, keys: List[Tuple[str, str]]):
+        """并发检查一批链接（键为 (分片名, 链接id)），结果按完成顺序写回并安排下次检查
+        
+        由有效变为失效的链接记入失效通知，由调用方在一轮检查结束后 flush。
+        """
+        shards = {}
+        owners = {}  # 链接id -> 分片名
+        links = []
+        for key, link_id in keys:
+            if key not in shards:
+                shards[key] = self.shards.get_by_key(key)
+            link = shards[key].get(link_id)
+            if link is not None:
+                owners[link_id] = key
+                links.append(link)
+        
+        async for link, is_valid, status_message, validators in self.checker.check_many(links):
+            key = owners[link["id"]]
+            if is_valid is None:
+                # 域名熔断中，链接没有真正检查：不改变状态、不通知，熔断冷却结束后再查
+                retry_at = time.time() + self.checker.retry_after(link["url"])
+                link["next_check"] = self.scheduler.schedule((key, link["id"]), due=retry_at)
+                shards[key].mark_dirty(link)
                 continue
-
-            is_valid, status_message = await self.check_link_validity(link["url"])
-            await self.update_link_status(link, is_valid, status_message)
+            was_valid = link.get("is_valid", True)
+            await self.update_link_status(link, is_valid, status_message, validators)
+            self.scheduler.reschedule((key, link["id"]), link)
+            shards[key].mark_dirty(link)
             
-            # 如果链接失效，通知创建者
-            if not is_valid:
+            # 链接刚刚失效时通知创建者，已经失效的链接复查时不再重复通知
+            if was_valid and not is_valid:
                 await self.notify_creator(link)
-
-        self.save_links(links)
+    
+    async def check_all_links(self):
+        """立即检查所有已到期的链接"""
+        keys = self.scheduler.pop_due()
+        try:
+            await self.check_links(keys)
+        except BaseException:
+            # 出错或被取消时，还没检查完的链接稍后重试
+            self.scheduler.retry_later(keys)
+            raise
+        finally:
+            # 本轮的失效链接按 (群, 创建者) 汇总成一条消息
+            self.notifier.flush()
     
     class CommandParser:
         """命令解析器"""
+        @staticmethod
+        def split_args(content: str) -> List[str]:
+            """将命令行风格的参数转换为列表，双引号内的空格不拆分"""
+            args_list = []
+            in_quotes = False
+            current_arg = []
+            
+            for char in content:
+                if char == '"':
+                    in_quotes = not in_quotes
+                elif char.isspace() and not in_quotes:
+                    if current_arg:
+                        args_list.append(''.join(current_arg))
+                        current_arg = []
+                else:
+                    current_arg.append(char)
+            
+            if current_arg:
+                args_list.append(''.join(current_arg))
+            return args_list
+        
         @staticmethod
         def parse_add_command(content: str) -> Dict[str, Any]:
             parser = argparse.ArgumentParser(description='添加或更新链接')
@@ -297,24 +464,7 @@ URL: {link['url']}
             parser.add_argument('-u', '--update', action='store_true', help='更新自己的描述')
             
             try:
-                # 将命令行风格的参数转换为列表
-                args_list = []
-                in_quotes = False
-                current_arg = []
-                
-                for char in content:
-                    if char == '"':
-                        in_quotes = not in_quotes
-                    elif char.isspace() and not in_quotes:
-                        if current_arg:
-                            args_list.append(''.join(current_arg))
-                            current_arg = []
-                    else:
-                        current_arg.append(char)
-                
-                if current_arg:
-                    args_list.append(''.join(current_arg))
-                
+                args_list = LinkManagerPlugin.CommandParser.split_args(content)
                 args = parser.parse_args(args_list)
                 return {
                     'url': args.url,
@@ -326,6 +476,28 @@ URL: {link['url']}
             except Exception as e:
                 return None
 
+        @staticmethod
+        def parse_search_command(content: str) -> Dict[str, Any]:
+            parser = argparse.ArgumentParser(description='搜索链接')
+            parser.add_argument('keyword', nargs='*', help='关键词')
+            parser.add_argument('-t', '--tags', help='标签，用逗号分隔表示同时包含，用|分隔表示包含任一', default='')
+            parser.add_argument('-p', '--page', type=int, help='页码', default=1)
+            parser.add_argument('-f', '--forward', action='store_true', help='以合并转发消息发送')
+            
+            try:
+                args = parser.parse_args(LinkManagerPlugin.CommandParser.split_args(content))
+                match_any = '|' in args.tags
+                separator = '|' if match_any else ','
+                return {
+                    'keyword': ' '.join(args.keyword),
+                    'tags': [tag.strip() for tag in args.tags.split(separator) if tag.strip()],
+                    'match_any': match_any,
+                    'page': max(args.page, 1),
+                    'forward': args.forward
+                }
+            except BaseException as e:
+                return None
+        
         @staticmethod
         def parse_view_command(content: str) -> Dict[str, Any]:
             parser = argparse.ArgumentParser(description='查看链接详情')
@@ -336,6 +508,39 @@ URL: {link['url']}
                 return {'url': args.url}
             except Exception as e:
                 return None
+        
+        @staticmethod
+        def parse_export_command(content: str) -> Dict[str, Any]:
+            parser = argparse.ArgumentParser(description='导出链接')
+            parser.add_argument('-g', '--group', help='群号，私聊链接为 private，默认导出所有群')
+            parser.add_argument('-t', '--tags', help='标签，用逗号分隔，需同时包含', default='')
+            parser.add_argument('--since', help='起始日期（含）')
+            parser.add_argument('--until', help='结束日期（含）')
+            parser.add_argument('--format', choices=FORMATS, default='jsonl', help='导出格式')
+            
+            try:
+                args = parser.parse_args(LinkManagerPlugin.CommandParser.split_args(content))
+                return {
+                    'group': args.group,
+                    'tags': [tag.strip() for tag in args.tags.split(',') if tag.strip()],
+                    'since': args.since,
+                    'until': args.until,
+                    'format': args.format
+                }
+            except BaseException as e:
+                return None
+        
+        @staticmethod
+        def parse_import_command(content: str) -> Dict[str, Any]:
+            parser = argparse.ArgumentParser(description='导入链接')
+            parser.add_argument('path', help='导入文件路径')
+            parser.add_argument('-g', '--group', help='导入到这个群，私聊链接为 private，默认使用记录中的群号')
+            
+            try:
+                args = parser.parse_args(LinkManagerPlugin.CommandParser.split_args(content))
+                return {'path': args.path, 'group': args.group}
+            except BaseException as e:
+                return None
     
     # 命令处理函数
     async def handle_website_command(self, msg, is_group=True):
@@ -435,9 +640,11 @@ URL: {link['url']}
         if not content:
             error_msg = MessageChain([
                 Text("""请提供搜索关键词，格式如下：
-/search <关键词> [-t 标签]
+/search <关键词> [-t 标签1,标签2] [-p 页码] [-f]
 示例：
-/search python -t 教程""")
+/search python -t 教程
+/search python -p 2
+/search -t 教程|python -f""")
             ])
             
             if is_group:
@@ -446,36 +653,233 @@ URL: {link['url']}
                 await self.api.post_private_msg(msg.user_id, rtf=error_msg)
             return
         
-        # 简单解析标签
-        parts = content.split("-t")
-        keyword = parts[0].strip()
-        tag = parts[1].strip() if len(parts) > 1 else None
+        # 解析命令
+        parsed = self.CommandParser.parse_search_command(content)
+        if not parsed or not (parsed["keyword"] or parsed["tags"]):
+            error_msg = MessageChain([
+                Text("命令格式错误，请检查参数格式")
+            ])
+            if is_group:
+                await self.api.post_group_msg(msg.group_id, rtf=error_msg)
+            else:
+                await self.api.post_private_msg(msg.user_id, rtf=error_msg)
+            return
         
-        # 搜索链接
+        # 只取出并格式化请求的那一页
         group_id = msg.group_id if is_group else None
-        results = self.search_links(keyword, group_id, tag)
+        page = parsed["page"]
+        forward = parsed["forward"]
+        page_size = self.config["search_forward_page_size"] if forward else self.config["search_page_size"]
+        results, total = self.search_page(parsed["keyword"], group_id, parsed["tags"],
+                                          page, page_size, parsed["match_any"])
+        pages = (total + page_size - 1) // page_size
         
         if not results:
+            text = "未找到相关链接" if total == 0 else f"没有第 {page} 页，共 {pages} 页"
             message = MessageChain([
-                Text("未找到相关链接")
+                Text(text)
             ])
         else:
-            result_text = ""
-            for link in results:
-                # 添加URL和标签
-                result_text += f"- {link['url']}"
-                if link.get("tags"):
-                    result_text += f" [标签: {', '.join(link['tags'])}]"
-                result_text += "\n"
-                
-                # 添加描述
-                for desc in link.get("descriptions", []):
-                    result_text += f"  描述 ({desc['username']}): {desc['content']}\n"
-                result_text += "\n"
+            footer = f"第 {page}/{pages} 页，共 {total} 条结果"
+            if page < pages:
+                footer += f"，使用 -p {page + 1} 查看下一页"
             
+            if forward and await self.send_forward_results(msg, results, footer, is_group):
+                return
+            
+            # 每页有总长度和行数预算，平均分给本页的每条结果
+            max_chars = self.config["search_page_max_chars"] // len(results)
+            max_lines = max(self.config["search_page_max_lines"] // len(results), 2)
+            entries = [self.format_search_entry(link, max_chars, max_lines) for link in results]
+            message = MessageChain([
+                Text("\n\n".join(entries) + f"\n\n{footer}")
+            ])
+        
+        if is_group:
+            await self.api.post_group_msg(msg.group_id, rtf=message)
+        else:
+            await self.api.post_private_msg(msg.user_id, rtf=message)
+
+    def format_search_entry(self, link: Dict, max_chars: int, max_lines: int) -> str:
+        """格式化一条搜索结果，超出字符数或行数预算的描述会被截断"""
+        header = f"- {link['url']}"
+        if link.get("tags"):
+            header += f" [标签: {', '.join(link['tags'])}]"
+        title = link.get("meta", {}).get("title")
+        if title:
+            header += f"\n  {title}"
+        lines = [header]
+        used = len(header)
+        
+        descriptions = link.get("descriptions", [])
+        for i, desc in enumerate(descriptions):
+            if len(lines) >= max_lines or used >= max_chars:
+                lines.append(f"  ……另有 {len(descriptions) - i} 条描述，使用 /view 查看")
+                break
+            line = f"  描述 ({desc['username']}): {desc['content']}"
+            if used + len(line) > max_chars:
+                line = line[:max(max_chars - used, 20)] + "…"
+            lines.append(line)
+            used += len(line)
+        return "\n".join(lines)
+
+    async def send_forward_results(self, msg, results: List[Dict], footer: str, is_group=True) -> bool:
+        """以合并转发消息发送一页搜索结果，每条链接一个节点；发送失败时返回 False"""
+        max_chars = self.config["search_forward_max_chars"]
+        texts = [self.format_search_entry(link, max_chars, max_chars) for link in results] + [footer]
+        nodes = [{
+            "type": "node",
+            "data": {
+                "user_id": str(getattr(msg, "self_id", "")),
+                "nickname": "链接搜索",
+                "content": [{"type": "text", "data": {"text": text}}]
+            }
+        } for text in texts]
+        
+        try:
+            if is_group:
+                await self.api.send_group_forward_msg(group_id=msg.group_id, messages=nodes)
+            else:
+                await self.api.send_private_forward_msg(user_id=msg.user_id, messages=nodes)
+            return True
+        except Exception as e:
+            print(f"发送合并转发消息失败，改为普通消息: {e}")
+            return False
+
+    async def handle_tags_command(self, msg, is_group=True):
+        """处理/tags命令"""
+        group_id = msg.group_id if is_group else None
+        top_tags = self.list_tags(group_id, self.config["tags_top_n"])
+        
+        if not top_tags:
+            message = MessageChain([
+                Text("暂无标签")
+            ])
+        else:
+            total = len(self.shards.get(group_id).tag_index)
+            lines = [f"{tag} ({count})" for tag, count in top_tags]
+            message = MessageChain([
+                Text(f"标签列表（共 {total} 个，按链接数排序）：\n" + "\n".join(lines))
+            ])
+        
+        if is_group:
+            await self.api.post_group_msg(msg.group_id, rtf=message)
+        else:
+            await self.api.post_private_msg(msg.user_id, rtf=message)
+
+    def is_admin(self, user_id) -> bool:
+        return str(user_id) in self.config["admin_ids"]
+
+    async def handle_export_command(self, msg, is_group=True):
+        """处理/export命令（仅管理员）：按群、标签、日期筛选后流式导出为 JSONL/CSV 文件"""
+        content = msg.raw_message.replace("/export", "", 1).strip()
+        parsed = self.CommandParser.parse_export_command(content)
+        
+        if not self.is_admin(msg.user_id):
+            message = MessageChain([
+                Text("只有管理员可以导出链接")
+            ])
+        elif not parsed:
             message = MessageChain([
-                Text(result_text.strip())
+                Text("""命令格式错误，正确格式：
+/export [-g 群号] [-t 标签1,标签2] [--since 2024-01-01] [--until 2024-01-31] [--format jsonl|csv]""")
             ])
+        else:
+            path = os.path.join(self.config["export_dir"],
+                                f"links-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{parsed['format']}")
+            links = filter_links(iter_links(self.shards, parsed["group"]),
+                                 parsed["tags"], parsed["since"], parsed["until"])
+            try:
+                count = export_links(links, path, parsed["format"])
+                message = MessageChain([
+                    Text(f"已导出 {count} 条链接到 {path}")
+                ])
+            except Exception as e:
+                message = MessageChain([
+                    Text(f"导出失败: {e}")
+                ])
+        
+        if is_group:
+            await self.api.post_group_msg(msg.group_id, rtf=message)
+        else:
+            await self.api.post_private_msg(msg.user_id, rtf=message)
+
+    async def handle_import_command(self, msg, is_group=True):
+        """处理/import命令（仅管理员）：分批导入 JSONL/CSV 文件，与 /add 一样按规范化 URL 去重"""
+        content = msg.raw_message.replace("/import", "", 1).strip()
+        parsed = self.CommandParser.parse_import_command(content)
+        
+        if not self.is_admin(msg.user_id):
+            message = MessageChain([
+                Text("只有管理员可以导入链接")
+            ])
+        elif not parsed:
+            message = MessageChain([
+                Text("""命令格式错误，正确格式：
+/import <文件路径> [-g 群号]
+文件扩展名为 .csv 时按 CSV 读取，否则按 JSONL 读取""")
+            ])
+        else:
+            added = merged = skipped = unfetched = 0
+            try:
+                for touched, batch_added, batch_merged, batch_skipped in import_batches(
+                        self.shards, read_records(parsed["path"]), self.config["import_batch_size"], parsed["group"]):
+                    # 每批只标记一次修改，由后台合并写入
+                    for shard in touched.values():
+                        shard.mark_dirty()
+                    # 新链接在一个检查周期内打散检查，避免集中请求
+                    for key, link in batch_added:
+                        link["next_check"] = self.scheduler.schedule(
+                            (key, link["id"]), spread=self.config["link_check_interval"])
+                        # 与 /add 一样在后台抓取页面元数据；抓取队列满了就不再提交
+                        if "meta" in link:
+                            continue
+                        if self.enricher.full():
+                            unfetched += 1
+                        else:
+                            self.enricher.submit((key, link["id"]), link["url"])
+                    added += len(batch_added)
+                    merged += batch_merged
+                    skipped += batch_skipped
+                    # 批次之间让出事件循环，导入期间其他命令照常响应
+                    await asyncio.sleep(0)
+                summary = f"导入完成：新增 {added} 条，合并 {merged} 条，跳过 {skipped} 条"
+                if unfetched:
+                    summary += f"\n抓取队列已满，{unfetched} 条新链接没有抓取页面标题"
+                message = MessageChain([
+                    Text(summary)
+                ])
+            except Exception as e:
+                message = MessageChain([
+                    Text(f"导入中断（已新增 {added} 条，合并 {merged} 条）: {e}")
+                ])
+        
+        if is_group:
+            await self.api.post_group_msg(msg.group_id, rtf=message)
+        else:
+            await self.api.post_private_msg(msg.user_id, rtf=message)
+
+    async def handle_site_command(self, msg, is_group=True):
+        """处理/site命令（仅管理员）：增量生成按群、按标签分类的静态网站页面"""
+        force = "--force" in msg.raw_message.split()
+        
+        if not self.is_admin(msg.user_id):
+            message = MessageChain([
+                Text("只有管理员可以生成网站")
+            ])
+        else:
+            try:
+                # 渲染和写文件在线程中进行，不阻塞事件循环
+                async with self._site_lock:
+                    start = time.perf_counter()
+                    stats = await asyncio.to_thread(self.site_generator.build, self.shards, force)
+                message = MessageChain([
+                    Text(f"网站已生成到 {self.config['site_dir']}（耗时 {time.perf_counter() - start:.2f} 秒）\n{stats}")
+                ])
+            except Exception as e:
+                message = MessageChain([
+                    Text(f"生成网站失败: {e}")
+                ])
         
         if is_group:
             await self.api.post_group_msg(msg.group_id, rtf=message)
@@ -524,7 +928,7 @@ URL: {link['url']}
 URL: {link_details['url']}
 创建者: {link_details['creator_name']}
 创建时间: {link_details['created_at']}
-标签: {', '.join(link_details['tags']) if link_details.get('tags') else '无'}{link_details.get('status_info', '')}
+标签: {', '.join(link_details['tags']) if link_details.get('tags') else '无'}{link_details.get('status_info', '')}{link_details.get('meta_info', '')}
 
 描述列表："""
             
@@ -547,8 +951,12 @@ URL: {link_details['url']}
         """处理/check_links命令"""
         try:
             await self.check_all_links()
+            text = "链接检查完成。所有链接已更新。"
+            open_hosts = self.checker.open_hosts()
+            if open_hosts:
+                text += f"\n以下域名连续无法访问，暂停检查：{', '.join(open_hosts)}"
             message = MessageChain([
-                Text("链接检查完成。所有链接已更新。")
+                Text(text)
             ])
         except Exception as e:
             message = MessageChain([
@@ -570,8 +978,15 @@ URL: {link_details['url']}
   -a: 追加新描述（不覆盖已有描述）
   -u: 更新自己的描述
 /view <链接URL> - 查看链接详细信息
-/search <关键词> [-t 标签] - 搜索链接
+/search <关键词> [-t 标签] [-p 页码] [-f] - 搜索链接
+  -t: 按标签筛选，标签1,标签2 表示同时包含，标签1|标签2 表示包含任一
+  -p: 查看指定页的结果
+  -f: 以合并转发消息发送，每页显示更多结果
+/tags - 查看本群的常用标签
 /check_links - 手动检查链接有效性
+/export [-g 群号] [-t 标签] [--since 日期] [--until 日期] [--format jsonl|csv] - 导出链接（管理员）
+/import <文件路径> [-g 群号] - 导入链接（管理员）
+/site [--force] - 生成静态网站页面（管理员）
 网站 - 获取技术分享网站链接
 公告 - 查看群公告"""
         
@@ -598,10 +1013,18 @@ URL: {link_details['url']}
             await self.handle_view_command(msg, is_group=True)
         elif msg.raw_message.startswith("/search"):
             await self.handle_search_command(msg, is_group=True)
+        elif msg.raw_message == "/tags":
+            await self.handle_tags_command(msg, is_group=True)
         elif msg.raw_message == "/help":
             await self.handle_help_command(msg, is_group=True)
         elif msg.raw_message.startswith("/check_links"):
             await self.handle_check_links_command(msg, is_group=True)
+        elif msg.raw_message.startswith("/export"):
+            await self.handle_export_command(msg, is_group=True)
+        elif msg.raw_message.startswith("/import"):
+            await self.handle_import_command(msg, is_group=True)
+        elif msg.raw_message.startswith("/site"):
+            await self.handle_site_command(msg, is_group=True)
     
     @bot.private_event()
     async def on_private_message(self, msg: PrivateMessage):
@@ -616,10 +1039,18 @@ URL: {link_details['url']}
             await self.handle_view_command(msg, is_group=False)
         elif msg.raw_message.startswith("/search"):
             await self.handle_search_command(msg, is_group=False)
+        elif msg.raw_message == "/tags":
+            await self.handle_tags_command(msg, is_group=False)
         elif msg.raw_message == "/help":
             await self.handle_help_command(msg, is_group=False)
         elif msg.raw_message.startswith("/check_links"):
             await self.handle_check_links_command(msg, is_group=False)
+        elif msg.raw_message.startswith("/export"):
+            await self.handle_export_command(msg, is_group=False)
+        elif msg.raw_message.startswith("/import"):
+            await self.handle_import_command(msg, is_group=False)
+        elif msg.raw_message.startswith("/site"):
+            await self.handle_site_command(msg, is_group=False)
     
     @bot.notice_event
     async def on_notice_event(self, msg):
@@ -0,0 +1,133 @@
+import time
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ncatbot.core.element import MessageChain, Text, At
+
+
+class PacedSender:
+    """限速消息发送队列
+
+    所有消息按 rate（条/秒）的速率依次发出，避免短时间内大量消息被 NapCat 限流或丢弃；
+    发送失败时按指数退避重试，重试用尽后调用备用发送函数（如果有）。
+    """
+
+    def __init__(self, rate: float = 1.0, max_retries: int = 3, retry_delay: float = 2.0):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._next_slot = 0.0
+
+    def submit(self, send: Callable[[], Awaitable], fallback: Optional[Callable[[], Awaitable]] = None):
+        """提交一条待发送的消息，send/fallback 为无参的异步发送函数"""
+        self._queue.put_nowait((send, fallback))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _wait_for_slot(self):
+        delay = self._next_slot - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_slot = time.monotonic() + self.interval
+
+    async def _send_with_retry(self, send: Callable[[], Awaitable]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_slot()
+            try:
+                await send()
+                return True
+            except Exception as e:
+                print(f"发送通知失败（第 {attempt + 1} 次）: {e}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        return False
+
+    async def _run(self):
+        while True:
+            send, fallback = await self._queue.get()
+            try:
+                if not await self._send_with_retry(send) and fallback is not None:
+                    await self._send_with_retry(fallback)
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 5.0):
+        """等待队列中的消息发完（最多 timeout 秒）后停止"""
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"仍有 {self._queue.qsize()} 条通知未发送")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+class DeadLinkNotifier:
+    """失效链接通知汇总
+
+    一个检查周期内，同一群同一创建者的所有失效链接合并成一条摘要消息，
+    通过 PacedSender 限速发送；群消息发送失败时改为私聊发送同样的摘要。
+    """
+
+    def __init__(self, api, sender: PacedSender, digest_limit: int = 20):
+        self.api = api
+        self.sender = sender
+        self.digest_limit = digest_limit
+        self._pending: Dict[Tuple[Optional[str], str], List[Dict]] = defaultdict(list)
+
+    def add(self, link: Dict):
+        """记录一条失效链接，等待 flush 时统一发送"""
+        if link.get("is_valid") or not link.get("creator_id"):
+            return
+        self._pending[(link.get("group_id"), link["creator_id"])].append({
+            "url": link["url"],
+            "invalid_since": link.get("invalid_since"),
+            "status_message": link.get("status_message"),
+        })
+
+    def _digest_lines(self, links: List[Dict]) -> str:
+        lines = []
+        for i, link in enumerate(links[:self.digest_limit], 1):
+            lines.append(f"{i}. {link['url']}\n   失效时间: {link['invalid_since']}  状态: {link['status_message']}")
+        if len(links) > self.digest_limit:
+            lines.append(f"……等共 {len(links)} 个链接")
+        return "\n".join(lines)
+
+    def flush(self):
+        """把本周期收集到的失效链接按 (群, 创建者) 生成摘要并提交发送"""
+        pending, self._pending = self._pending, defaultdict(list)
+        for (group_id, creator_id), links in pending.items():
+            body = self._digest_lines(links)
+            private_message = MessageChain([
+                Text(f"您在群 {group_id} 中添加的 {len(links)} 个链接已失效：\n" if group_id
+                     else f"您添加的 {len(links)} 个链接已失效：\n"),
+                Text(body),
+                Text("\n请检查并更新链接。")
+            ])
+
+            async def send_private(creator_id=creator_id, message=private_message):
+                await self.api.post_private_msg(creator_id, rtf=message)
+
+            if group_id:
+                group_message = MessageChain([
+                    At(creator_id),  # @创建者
+                    Text(f"\n您添加的 {len(links)} 个链接已失效：\n"),
+                    Text(body),
+                    Text("\n请检查并更新链接。")
+                ])
+
+                async def send_group(group_id=group_id, message=group_message):
+                    await self.api.post_group_msg(group_id, rtf=message)
+
+                # 如果群发送失败，改为私聊通知
+                self.sender.submit(send_group, fallback=send_private)
+            else:
+                self.sender.submit(send_private)
@@ -0,0 +1,143 @@
+import time
+import heapq
+import random
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class RecheckScheduler:
+    """链接复查调度器
+
+    用最小堆按下次检查时间（epoch 秒）排列所有链接，后台任务只在最早的链接到期时醒来，
+    每次取出一批到期链接的键交给 run_batch 检查，到期的链接全部检查完后调用 on_sweep_end（如果有）。堆里只保存键（分片名, 链接id），
+    不持有链接本身，分片被移出内存后不会因为调度而常驻。
+    失效链接按指数退避重试，持续有效的链接检查间隔逐渐拉长，所有间隔都带随机抖动。
+    """
+
+    def __init__(self, run_batch: Callable[[List[Hashable]], Awaitable[None]],
+                 base_interval: float, retry_interval: float, max_interval: float,
+                 jitter: float = 0.1, batch_size: int = 50,
+                 on_sweep_end: Optional[Callable[[], None]] = None):
+        self.run_batch = run_batch
+        self.on_sweep_end = on_sweep_end
+        self.base_interval = base_interval
+        self.retry_interval = retry_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.batch_size = batch_size
+        self._heap: List[Tuple[float, int, Hashable]] = []  # (到期时间, 序号, 键)
+        self._due: Dict[Hashable, float] = {}
+        self._seq = 0
+        self._swept = False  # 上次调用 on_sweep_end 之后是否检查过链接
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def next_interval(self, link: Dict) -> float:
+        """根据连续失败/成功次数计算下次检查的间隔"""
+        failures = link.get("fail_count", 0)
+        if failures:
+            interval = self.retry_interval * 2 ** min(failures - 1, 20)
+        else:
+            interval = self.base_interval * 2 ** min(max(link.get("ok_streak", 0) - 1, 0), 20)
+        return self._jittered(min(interval, self.max_interval))
+
+    def schedule(self, key: Hashable, due: Optional[float] = None, spread: float = 0.0) -> float:
+        """安排一个键的下次检查，O(log n)
+
+        Args:
+            key: 链接的键
+            due: 到期时间；为 None 时在 [now, now + spread) 内随机安排
+            spread: 见 due
+
+        Returns:
+            实际的到期时间
+        """
+        if due is None:
+            due = time.time() + random.uniform(0, spread)
+        self._due[key] = due
+        self._seq += 1
+        if not self._heap or due < self._heap[0][0]:
+            # 新的最早到期时间，唤醒后台任务重新计算等待时长
+            self._wakeup.set()
+        heapq.heappush(self._heap, (due, self._seq, key))
+        return due
+
+    def reschedule(self, key: Hashable, link: Dict):
+        """检查结束后按退避策略安排下次检查，并记录到链接的 next_check 字段"""
+        link["next_check"] = self.schedule(key, due=time.time() + self.next_interval(link))
+
+    def retry_later(self, keys: List[Hashable]):
+        """检查出错的一批键稍后重试（已经重新安排过的除外），避免链接从调度中丢失"""
+        for key in keys:
+            if key not in self._due:
+                self.schedule(key, due=time.time() + self._jittered(self.retry_interval))
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[Hashable]:
+        """取出所有（至多 limit 个）已到期的键"""
+        now = time.time() if now is None else now
+        due_keys = []
+        while self._heap and self._heap[0][0] <= now:
+            if limit is not None and len(due_keys) >= limit:
+                break
+            due, _, key = heapq.heappop(self._heap)
+            # 被重新安排过的键，堆里的旧条目直接丢弃
+            if self._due.get(key) != due:
+                continue
+            del self._due[key]
+            due_keys.append(key)
+        return due_keys
+
+    def _next_due(self) -> Optional[float]:
+        """返回最早的有效到期时间，顺便清理堆顶的过期条目"""
+        while self._heap:
+            due, _, key = self._heap[0]
+            if self._due.get(key) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            next_due = self._next_due()
+            delay = None if next_due is None else next_due - time.time()
+            if delay is None or delay > 0:
+                if self._swept and self.on_sweep_end is not None:
+                    self._swept = False
+                    self.on_sweep_end()
+                # 不用 wait_for：它在等待刚好完成时会吞掉 cancel，导致 stop() 卡住
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=delay)
+                finally:
+                    waiter.cancel()
+                continue
+            batch = self.pop_due(limit=self.batch_size)
+            if batch:
+                self._swept = True
+                try:
+                    await self.run_batch(batch)
+                except Exception as e:
+                    print(f"定时检查链接出错: {e}")
+                    self.retry_later(batch)
+
+    def start(self):
+        """启动后台调度任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台调度任务"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
@@ -0,0 +1,319 @@
+import re
+import math
+import heapq
+import bisect
+from collections import Counter
+from typing import AbstractSet, Callable, Dict, List, Optional, Set, Tuple
+
+# 中文按连续汉字切分后做二元组，拉丁文字按单词切分
+_TOKEN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+# URL 中几乎每条链接都有、没有区分度的片段
+_URL_STOPWORDS = {"http", "https", "www", "html", "htm", "index", "php"}
+
+# 标签比正文更能代表链接内容，计入词频时加权
+_TAG_WEIGHT = 2
+
+# 查询词不在词表中时，按前缀扩展的最大词数
+_MAX_PREFIX_EXPANSION = 50
+
+# 模糊匹配：只对不短于该长度的词建立三元组索引，每个查询词最多扩展到最相似的若干个词
+_FUZZY_MIN_LENGTH = 3
+_MAX_FUZZY_EXPANSION = 10
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：中文使用字符二元组（单个汉字保留为一元组），拉丁文字使用小写单词"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def tokenize_url(url: str) -> List[str]:
+    """URL 分词，去掉协议、www 等无区分度的片段"""
+    return [token for token in tokenize(url) if token not in _URL_STOPWORDS]
+
+
+def trigrams(term: str) -> Set[str]:
+    """词的字符三元组，首尾补边界符，使词首词尾的字符也能参与比较"""
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def link_terms(link: Dict) -> Counter:
+    """提取一条链接参与检索的词及其词频（URL、标签、描述、页面标题和简介）"""
+    terms = Counter(tokenize_url(link.get("url", "")))
+    meta = link.get("meta", {})
+    terms.update(tokenize(meta.get("title", "")))
+    terms.update(tokenize(meta.get("description", "")))
+    for tag in link.get("tags", []):
+        for token in tokenize(tag):
+            terms[token] += _TAG_WEIGHT
+    for desc in link.get("descriptions", []):
+        terms.update(tokenize(desc.get("content", "")))
+    return terms
+
+
+def contains_keyword(link: Dict, keyword: str) -> bool:
+    """链接的 URL、标签、描述或页面标题、简介中是否包含关键词（不区分大小写）
+
+    用于分词后没有任何词的关键词（只有标点、韩文等），这时无法使用倒排索引。
+    """
+    keyword = keyword.lower()
+    meta = link.get("meta", {})
+    fields = [link.get("url", ""), meta.get("title", ""), meta.get("description", "")]
+    fields.extend(link.get("tags", []))
+    fields.extend(desc.get("content", "") for desc in link.get("descriptions", []))
+    return any(keyword in field.lower() for field in fields)
+
+
+def _discard(table: Dict[str, Set[str]], key: str, term: str):
+    """从 键 -> 词集合 的表中删除一个词，集合为空时删除该键"""
+    terms = table.get(key)
+    if terms is None:
+        return
+    terms.discard(term)
+    if not terms:
+        del table[key]
+
+
+class SearchIndex:
+    """增量维护的倒排索引，使用 BM25 对结果排序
+
+    每条链接以其 id 作为文档编号。链接内容变化后调用 add() 即可替换旧的索引项，
+    不需要重建整个索引。
+
+    另外对词表维护一份 三元组 -> 词 的倒排表，精确搜索没有结果时，
+    查询词按三元组相似度（Dice 系数）映射到词表中拼写相近的词，用于容错搜索。
+    中文二元组还按其中的每个汉字登记到 汉字 -> 二元组 的表中，
+    单个汉字的查询能匹配所有包含该字的二元组，而不只是以它开头的。
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, fuzzy_threshold: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.fuzzy_threshold = fuzzy_threshold
+        self.trigram_index: Dict[str, Set[str]] = {}   # 三元组 -> 词
+        self.char_index: Dict[str, Set[str]] = {}      # 汉字 -> 包含它的二元组
+        self.postings: Dict[str, Dict[str, int]] = {}  # 词 -> {链接id: 词频}
+        self.doc_terms: Dict[str, Counter] = {}        # 链接id -> 词频表，用于增量删除
+        self.doc_lengths: Dict[str, int] = {}
+        self.docs: Dict[str, Dict] = {}
+        self.total_length = 0
+        self._sorted_terms: List[str] = []
+        self._terms_dirty = False
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def build(self, links: List[Dict]):
+        """从链接列表构建索引（仅在加载时调用）"""
+        for link in links:
+            self.add(link)
+
+    def add(self, link: Dict):
+        """添加或更新一条链接的索引项"""
+        doc_id = link["id"]
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        terms = link_terms(link)
+        for term, tf in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                self._terms_dirty = True
+                self._index_term(term)
+            posting[doc_id] = tf
+        length = sum(terms.values())
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = length
+        self.docs[doc_id] = link
+        self.total_length += length
+
+    def remove(self, doc_id: str):
+        """删除一条链接的索引项"""
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+                self._terms_dirty = True
+                self._unindex_term(term)
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+        self.docs.pop(doc_id, None)
+
+    def _index_term(self, term: str):
+        if len(term) == 2 and _CJK_RE.match(term):
+            for char in set(term):
+                self.char_index.setdefault(char, set()).add(term)
+        if len(term) < _FUZZY_MIN_LENGTH:
+            return
+        for gram in trigrams(term):
+            self.trigram_index.setdefault(gram, set()).add(term)
+
+    def _unindex_term(self, term: str):
+        if len(term) == 2 and _CJK_RE.match(term):
+            for char in set(term):
+                _discard(self.char_index, char, term)
+        if len(term) < _FUZZY_MIN_LENGTH:
+            return
+        for gram in trigrams(term):
+            _discard(self.trigram_index, gram, term)
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """把查询词映射到词表中的词：精确命中直接返回，否则按前缀扩展，结果为 (词, 权重)
+
+        单个汉字映射到单独出现的该字以及所有包含它的二元组。
+        """
+        if len(term) == 1 and _CJK_RE.match(term):
+            expanded = [(candidate, 1.0) for candidate in sorted(self.char_index.get(term, ()))]
+            if term in self.postings:
+                expanded.append((term, 1.0))
+            return expanded
+        if term in self.postings:
+            return [(term, 1.0)]
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self.postings)
+            self._terms_dirty = False
+        expanded = []
+        start = bisect.bisect_left(self._sorted_terms, term)
+        for candidate in self._sorted_terms[start:start + _MAX_PREFIX_EXPANSION]:
+            if not candidate.startswith(term):
+                break
+            expanded.append((candidate, 1.0))
+        return expanded
+
+    def _expand_fuzzy(self, term: str) -> List[Tuple[str, float]]:
+        """按三元组相似度把查询词映射到拼写相近的词，结果为 (词, 相似度)"""
+        if len(term) < _FUZZY_MIN_LENGTH:
+            return []
+        grams = trigrams(term)
+        threshold = self.fuzzy_threshold
+        # Dice 系数 2s / (|q| + |t|) >= threshold，且 s <= |t|，可推出至少要共享的三元组数
+        min_shared = max(math.ceil(threshold * len(grams) / (2 - threshold) - 1e-9), 1)
+        postings = sorted((self.trigram_index.get(gram, set()) for gram in grams), key=len)
+        # 共享 min_shared 个三元组的词，必然出现在最短的 len(grams) - min_shared + 1 个倒排表之一中
+        candidates = set()
+        for terms in postings[:len(postings) - min_shared + 1]:
+            candidates.update(terms)
+
+        similar = []
+        for candidate in candidates:
+            candidate_grams = trigrams(candidate)
+            shared = len(grams & candidate_grams)
+            if shared < min_shared:
+                continue
+            similarity = 2 * shared / (len(grams) + len(candidate_grams))
+            if similarity >= threshold:
+                similar.append((candidate, similarity))
+        return heapq.nlargest(_MAX_FUZZY_EXPANSION, similar, key=lambda item: (item[1], item[0]))
+
+    def score(self, query: str, accept: Optional[Callable[[Dict], bool]] = None,
+              within: Optional[AbstractSet[str]] = None, fuzzy: bool = False) -> Dict[str, float]:
+        """计算所有匹配链接的 BM25 得分，返回 {链接id: 得分}
+
+        Args:
+            query: 查询文本，链接需要匹配所有查询词
+            accept: 过滤函数，只对返回 True 的链接计分
+            within: 候选链接id集合（例如按标签筛选的结果），只在其中搜索
+            fuzzy: 为 True 时，词表中找不到的查询词改用拼写相近的词匹配，得分按相似度折算
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms or not self.docs:
+            return {}
+
+        # 每个查询词扩展成一组词，文档需要命中每一组中的至少一个词
+        groups = []
+        for term in query_terms:
+            expanded = self._expand(term)
+            if not expanded and fuzzy:
+                expanded = self._expand_fuzzy(term)
+            if not expanded:
+                return {}
+            groups.append(expanded)
+
+        # 从最短的候选集开始求交集
+        candidate_sets = []
+        for expanded in groups:
+            if len(expanded) == 1:
+                candidate_sets.append(self.postings[expanded[0][0]].keys())
+            else:
+                merged = set()
+                for term, _ in expanded:
+                    merged.update(self.postings[term])
+                candidate_sets.append(merged)
+        if within is not None:
+            candidate_sets.append(within)
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0])
+        for other in candidate_sets[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                return {}
+
+        if accept is not None:
+            candidates = {doc_id for doc_id in candidates if accept(self.docs[doc_id])}
+            if not candidates:
+                return {}
+
+        total_docs = len(self.docs)
+        avg_length = self.total_length / total_docs if total_docs else 1.0
+        k1 = self.k1
+        base = k1 * (1 - self.b)
+        length_factor = k1 * self.b / avg_length
+        doc_lengths = self.doc_lengths
+        scores = dict.fromkeys(candidates, 0.0)
+        for expanded in groups:
+            for term, weight in expanded:
+                posting = self.postings[term]
+                df = len(posting)
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5)) * (k1 + 1) * weight
+                # 遍历倒排表和候选集中较小的一方
+                if df < len(scores):
+                    for doc_id, tf in posting.items():
+                        if doc_id in scores:
+                            scores[doc_id] += idf * tf / (tf + base + length_factor * doc_lengths[doc_id])
+                else:
+                    for doc_id in scores:
+                        tf = posting.get(doc_id)
+                        if tf:
+                            scores[doc_id] += idf * tf / (tf + base + length_factor * doc_lengths[doc_id])
+        return scores
+
+    def search(self, query: str, limit: Optional[int] = None,
+               accept: Optional[Callable[[Dict], bool]] = None,
+               within: Optional[AbstractSet[str]] = None) -> List[Tuple[float, Dict]]:
+        """按 BM25 得分返回匹配的链接，结果为 (得分, 链接) 列表，limit 为 None 时返回全部
+
+        精确匹配没有结果时，自动改用模糊匹配。
+        """
+        scores = self.score(query, accept, within) or self.score(query, accept, within, fuzzy=True)
+        if limit is None:
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, self.docs[doc_id]) for doc_id, score in ranked]
+
+    def search_page(self, query: str, offset: int, count: int,
+                    accept: Optional[Callable[[Dict], bool]] = None,
+                    within: Optional[AbstractSet[str]] = None) -> Tuple[List[Tuple[float, Dict]], int]:
+        """分页搜索，只对前 offset + count 个结果排序，返回 (本页结果, 匹配总数)
+
+        精确匹配没有结果时，自动改用模糊匹配。
+        """
+        scores = self.score(query, accept, within) or self.score(query, accept, within, fuzzy=True)
+        ranked = heapq.nlargest(offset + count, scores.items(), key=lambda item: item[1])
+        return [(score, self.docs[doc_id]) for doc_id, score in ranked[offset:]], len(scores)
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import asyncio
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .store import LinkStore, merge_link
+from .search_index import SearchIndex
+from .tag_index import TagIndex
+from .urls import canonicalize_url
+
+# 私聊添加的链接统一放在这个分片中
+PRIVATE_SHARD = "private"
+
+
+def shard_key(group_id: Optional[str]) -> str:
+    """群号对应的分片名，私聊链接使用 PRIVATE_SHARD"""
+    return PRIVATE_SHARD if group_id is None else str(group_id)
+
+
+class LinkShard:
+    """一个群（或私聊）的链接数据及其索引"""
+
+    def __init__(self, key: str, path: str, flush_delay: float, schedule_path: Optional[str] = None):
+        self.key = key
+        self.store = LinkStore(path, flush_delay, schedule_path)
+        self.search_index = SearchIndex()
+        self.tag_index = TagIndex()
+        self.url_index: Dict[str, Dict] = {}  # 规范化URL -> 链接
+        self.id_index: Dict[str, Dict] = {}   # 链接id -> 链接
+        # 每条链接最后一次修改时的 store.revision；不指定链接的修改记在 untracked_revision，
+        # 供增量生成网站等功能只重新处理变化过的链接
+        self.link_revisions: Dict[str, int] = {}
+        self.untracked_revision = 0
+        self.last_access = time.monotonic()
+
+    @property
+    def links(self) -> List[Dict]:
+        return self.store.links
+
+    def load(self):
+        """加载分片数据并构建索引"""
+        self.store.load()
+        for link in self.store.links:
+            self.url_index[canonicalize_url(link["url"])] = link
+            self.id_index[link["id"]] = link
+        self.search_index.build(self.store.links)
+        self.tag_index.build(self.store.links)
+
+    def reindex(self, link: Dict):
+        """链接内容或标签变化后更新索引"""
+        self.search_index.add(link)
+        self.tag_index.add(link)
+
+    def find(self, url: str) -> Optional[Dict]:
+        return self.url_index.get(canonicalize_url(url))
+
+    def get(self, link_id: str) -> Optional[Dict]:
+        return self.id_index.get(link_id)
+
+    def append(self, link: Dict, canonical: Optional[str] = None):
+        """添加一条新链接（调用方负责调用 reindex 和标记修改），canonical 为已算好的规范化URL"""
+        self.store.links.append(link)
+        self.url_index[canonical or canonicalize_url(link["url"])] = link
+        self.id_index[link["id"]] = link
+
+    def mark_dirty(self, link: Optional[Dict] = None):
+        """标记分片已修改；传入 link 时记录修改的是哪条链接"""
+        self.store.mark_dirty()
+        if link is None:
+            self.untracked_revision = self.store.revision
+        else:
+            self.link_revisions[link["id"]] = self.store.revision
+
+
+class ShardManager:
+    """按群分片的链接存储
+
+    每个群一个文件（私聊链接一个文件），在该群第一次使用时才加载，
+    空闲超过 idle_timeout 秒后落盘并从内存中移除。每个分片有独立的写锁，
+    不同群的写入互不等待。
+    """
+
+    def __init__(self, directory: str, flush_delay: float = 2.0, idle_timeout: float = 1800):
+        self.directory = directory
+        self.flush_delay = flush_delay
+        self.idle_timeout = idle_timeout
+        self._shards: Dict[str, LinkShard] = {}
+        self._evict_task: Optional[asyncio.Task] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def schedule_path_for(self, key: str) -> str:
+        """分片的检查时间索引，与分片文件放在一起"""
+        return os.path.join(self.directory, f"{key}.schedule")
+
+    def get(self, group_id: Optional[str]) -> LinkShard:
+        """获取群对应的分片，首次访问时从文件加载"""
+        return self.get_by_key(shard_key(group_id))
+
+    def get_by_key(self, key: str) -> LinkShard:
+        shard = self._shards.get(key)
+        if shard is None:
+            shard = LinkShard(key, self.path_for(key), self.flush_delay, self.schedule_path_for(key))
+            shard.load()
+            self._shards[key] = shard
+        shard.last_access = time.monotonic()
+        return shard
+
+    def keys(self) -> List[str]:
+        """所有分片（包括尚未加载的）的名称"""
+        keys = {name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json")}
+        keys.update(self._shards)
+        return sorted(keys)
+
+    def loaded(self) -> List[LinkShard]:
+        return list(self._shards.values())
+
+    def loaded_shard(self, key: str) -> Optional[LinkShard]:
+        """已加载的分片，未加载时返回 None（不会触发加载）"""
+        return self._shards.get(key)
+
+    def iter_shards(self) -> Iterator[LinkShard]:
+        """依次访问所有分片（会按需加载）"""
+        for key in self.keys():
+            yield self.get_by_key(key)
+
+    def peek_links(self, key: str) -> List[Dict]:
+        """读取分片的链接数据：已加载的直接返回内存中的数据，否则临时读取文件，不留在内存"""
+        shard = self._shards.get(key)
+        if shard is not None:
+            return shard.links
+        return LinkStore(self.path_for(key)).load()
+
+    def peek_schedule(self, key: str) -> List[Tuple[str, Optional[float]]]:
+        """读取分片中每条链接的 (id, next_check)，不加载到内存
+
+        优先读取检查时间索引；索引缺失、损坏或比分片文件旧（写入中途崩溃）时才解析整个分片，并重建索引。
+        """
+        if key in self._shards:
+            return [(link["id"], link.get("next_check")) for link in self._shards[key].links]
+        schedule_path = self.schedule_path_for(key)
+        try:
+            if os.path.getmtime(schedule_path) >= os.path.getmtime(self.path_for(key)):
+                with open(schedule_path, encoding="utf-8", mode="r") as f:
+                    return list(json.load(f).items())
+        except (OSError, ValueError):
+            pass
+        schedule = {link["id"]: link.get("next_check") for link in self.peek_links(key)}
+        try:
+            LinkStore._replace_file(schedule_path, json.dumps(schedule))
+        except OSError as e:
+            print(f"写入检查时间索引失败 {schedule_path}: {e}")
+        return list(schedule.items())
+
+    def migrate_legacy(self, legacy_path: str) -> int:
+        """把旧版的单文件数据拆分到各个分片，完成后旧文件改名为 .migrated
+
+        与 add_link、导入一样按规范化 URL 去重：分片中已有的链接只合并描述和标签。
+
+        Returns:
+            迁移的链接数
+        """
+        if not os.path.exists(legacy_path):
+            return 0
+        legacy = LinkStore(legacy_path)
+        by_shard: Dict[str, List[Dict]] = defaultdict(list)
+        for link in legacy.load():
+            by_shard[shard_key(link.get("group_id"))].append(link)
+        for key, links in by_shard.items():
+            store = LinkStore(self.path_for(key), schedule_path=self.schedule_path_for(key))
+            by_url = {canonicalize_url(link["url"]): link for link in store.load()}
+            for link in links:
+                canonical = canonicalize_url(link["url"])
+                existing = by_url.get(canonical)
+                if existing is not None:
+                    merge_link(existing, link)
+                else:
+                    by_url[canonical] = link
+                    store.links.append(link)
+            store.mark_dirty()
+            store.flush_now()
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        return sum(len(links) for links in by_shard.values())
+
+    async def evict_idle(self):
+        """把空闲的分片落盘后移出内存"""
+        now = time.monotonic()
+        for key, shard in list(self._shards.items()):
+            if now - shard.last_access < self.idle_timeout:
+                continue
+            await shard.store.close()
+            # 落盘期间可能又被访问或修改，再确认一次
+            if (self._shards.get(key) is shard and shard.store.is_clean()
+                    and time.monotonic() - shard.last_access >= self.idle_timeout):
+                del self._shards[key]
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 1))
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                print(f"释放空闲分片时出错: {e}")
+
+    def start(self):
+        if self._evict_task is None or self._evict_task.done():
+            self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def close(self):
+        """停止后台任务并把所有已加载的分片落盘"""
+        if self._evict_task is not None and not self._evict_task.done():
+            self._evict_task.cancel()
+            try:
+                await self._evict_task
+            except asyncio.CancelledError:
+                pass
+        self._evict_task = None
+        await asyncio.gather(*(shard.store.close() for shard in self._shards.values()))
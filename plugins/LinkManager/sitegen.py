@@ -0,0 +1,328 @@
+"""根据链接数据生成静态网站（Markdown 或 HTML）
+
+每个群一个页面，群内每个标签一个页面，另有一个列出所有群的首页。
+生成是增量的：
+- 内存中记录每个分片上次生成时的状态（已加载分片的修改次数，或未加载分片的文件修改时间），
+  状态没变的群直接跳过，不读取也不计算
+- 需要处理的群，按每条链接参与展示的字段计算内容哈希（分片一直在内存中时，只重新计算修改过的链接），
+  页面的哈希由其中所有链接的哈希得出，与清单（.manifest.json）中记录的相同时不重新渲染、不写文件
+- 不再需要的页面（如标签已被删除）会被删除
+
+插件在线程中调用 build()，事件循环同时可能在修改链接：每个群的链接列表先复制一份再处理，
+记录的修改次数取自计算之前，生成期间的修改会在下次生成时处理。同一个生成器不能同时执行两次 build()。
+
+也可以在机器人未运行时通过命令行使用：
+    python -m plugins.LinkManager.sitegen -o data/site [--format html]
+"""
+import os
+import re
+import sys
+import json
+import html
+import hashlib
+import weakref
+import argparse
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .shards import ShardManager, PRIVATE_SHARD
+
+# 页面模板变化时修改版本号，强制重新生成所有页面
+SITE_VERSION = 1
+
+FORMATS = {"markdown": ".md", "html": ".html"}
+
+_UNSAFE_CHARS_RE = re.compile(r"[^\w\-.]+")
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def link_digest(link: Dict) -> str:
+    """链接中参与页面展示的字段的哈希"""
+    return _digest(json.dumps([
+        link.get("url"),
+        link.get("created_at"),
+        link.get("tags", []),
+        link.get("is_valid", True),
+        link.get("meta", {}).get("title", ""),
+        [(desc.get("username"), desc.get("content")) for desc in link.get("descriptions", [])],
+    ], ensure_ascii=False))
+
+
+def slugify(name: str) -> str:
+    """把标签、群号转换成安全的文件名，转换过的名称加上哈希后缀避免冲突"""
+    slug = _UNSAFE_CHARS_RE.sub("-", name).strip("-.")
+    if slug == name:
+        return slug
+    return f"{slug or 'tag'}-{_digest(name)[:8]}"
+
+
+@dataclass
+class SiteBuildStats:
+    groups_built: int = 0     # 重新计算过的群
+    groups_skipped: int = 0   # 状态未变、直接跳过的群
+    pages_written: int = 0
+    pages_unchanged: int = 0
+    pages_removed: int = 0
+
+    def __str__(self) -> str:
+        return (f"处理 {self.groups_built} 个群（跳过 {self.groups_skipped} 个未变化的群），"
+                f"写入 {self.pages_written} 个页面，{self.pages_unchanged} 个页面无变化，"
+                f"删除 {self.pages_removed} 个页面")
+
+
+class SiteGenerator:
+    """增量静态网站生成器，见模块说明"""
+
+    def __init__(self, output_dir: str, fmt: str = "markdown", site_title: str = "技术分享"):
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的格式: {fmt}")
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.ext = FORMATS[fmt]
+        self.site_title = site_title
+        self.manifest_path = os.path.join(output_dir, ".manifest.json")
+        self.manifest = self._load_manifest()
+        self._shard_states: Dict[str, Tuple] = {}
+        self._digest_cache: Dict[str, Tuple] = {}  # 分片名 -> (分片弱引用, 计算时的 revision, {链接id: 哈希})
+        self._fragments: Dict[str, str] = {}  # 链接哈希 -> 渲染结果，同一链接出现在多个页面时只渲染一次
+
+    def _load_manifest(self) -> Dict:
+        empty = {"version": SITE_VERSION, "format": self.fmt, "groups": {}, "pages": {}}
+        try:
+            with open(self.manifest_path, encoding="utf-8", mode="r") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return empty
+        if manifest.get("version") != SITE_VERSION or manifest.get("format") != self.fmt:
+            return empty
+        return manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, encoding="utf-8", mode="w") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(temp_path, self.manifest_path)
+
+    def _shard_state(self, shards: ShardManager, key: str) -> Tuple:
+        """分片的当前状态：已加载的用修改次数，未加载的用文件的修改时间和大小"""
+        shard = shards.loaded_shard(key)
+        if shard is not None:
+            # 用弱引用比较，分片被移出内存后重新加载时不会误判为同一个
+            return ("loaded", weakref.ref(shard), shard.store.revision)
+        try:
+            stat = os.stat(shards.path_for(key))
+        except FileNotFoundError:
+            return ("missing",)
+        return ("file", stat.st_mtime_ns, stat.st_size)
+
+    def _link_digests(self, shards: ShardManager, key: str, links: List[Dict]) -> Dict[str, str]:
+        """每条链接的哈希；分片自上次生成后一直在内存中时，只重新计算之后修改过的链接"""
+        shard = shards.loaded_shard(key)
+        revision = shard.store.revision if shard is not None else 0
+        cached = self._digest_cache.get(key)
+        if (shard is None or cached is None or cached[0]() is not shard
+                or shard.untracked_revision > cached[1]):
+            digests = {link["id"]: link_digest(link) for link in links}
+        else:
+            _, built_revision, old_digests = cached
+            revisions = shard.link_revisions
+            digests = {}
+            for link in links:
+                link_id = link["id"]
+                digest = old_digests.get(link_id)
+                if digest is None or revisions.get(link_id, 0) > built_revision:
+                    digest = link_digest(link)
+                digests[link_id] = digest
+        if shard is not None:
+            self._digest_cache[key] = (weakref.ref(shard), revision, digests)
+        else:
+            self._digest_cache.pop(key, None)
+        return digests
+
+    # 渲染
+
+    def _group_title(self, key: str) -> str:
+        return "私聊分享" if key == PRIVATE_SHARD else f"群 {key}"
+
+    def _render_link(self, link: Dict, digest: str) -> str:
+        fragment = self._fragments.get(digest)
+        if fragment is not None:
+            return fragment
+        title = link.get("meta", {}).get("title") or link["url"]
+        invalid = not link.get("is_valid", True)
+        if self.fmt == "markdown":
+            lines = [f"- [{title}]({link['url']})" + ("（已失效）" if invalid else "")]
+            if link.get("tags"):
+                lines.append(f"  - 标签: {', '.join(link['tags'])}")
+            for desc in link.get("descriptions", []):
+                lines.append(f"  - {desc.get('username', '')}: {desc.get('content', '')}")
+            fragment = "\n".join(lines)
+        else:
+            parts = [f'<li><a href="{html.escape(link["url"])}">{html.escape(title)}</a>'
+                     + ("（已失效）" if invalid else "")]
+            if link.get("tags"):
+                parts.append(f"<div class=\"tags\">标签: {html.escape(', '.join(link['tags']))}</div>")
+            for desc in link.get("descriptions", []):
+                parts.append(f"<p>{html.escape(desc.get('username', ''))}: {html.escape(desc.get('content', ''))}</p>")
+            parts.append("</li>")
+            fragment = "".join(parts)
+        self._fragments[digest] = fragment
+        return fragment
+
+    def _render_page(self, title: str, body: Iterable[str], nav: List[Tuple[str, str]]) -> str:
+        if self.fmt == "markdown":
+            header = [f"# {title}", ""]
+            if nav:
+                header.append(" | ".join(f"[{name}]({href})" for name, href in nav))
+                header.append("")
+            return "\n".join(header) + "\n" + "\n".join(body) + "\n"
+        nav_html = " | ".join(f'<a href="{html.escape(href)}">{html.escape(name)}</a>' for name, href in nav)
+        return ("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+                f"<title>{html.escape(title)}</title></head><body>\n"
+                f"<h1>{html.escape(title)}</h1>\n<nav>{nav_html}</nav>\n<ul>\n"
+                + "\n".join(body) + "\n</ul>\n</body></html>\n")
+
+    def _write_page(self, path: str, digest: str, render, stats: SiteBuildStats):
+        """页面哈希与清单相同且文件存在时跳过，否则渲染并写入"""
+        full_path = os.path.join(self.output_dir, path)
+        if self.manifest["pages"].get(path) == digest and os.path.exists(full_path):
+            stats.pages_unchanged += 1
+            return
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, encoding="utf-8", mode="w") as f:
+            f.write(render())
+        self.manifest["pages"][path] = digest
+        stats.pages_written += 1
+
+    def _remove_page(self, path: str, stats: SiteBuildStats):
+        self.manifest["pages"].pop(path, None)
+        try:
+            os.remove(os.path.join(self.output_dir, path))
+            stats.pages_removed += 1
+        except FileNotFoundError:
+            pass
+
+    # 生成
+
+    def _build_group(self, key: str, links: List[Dict], digests: Dict[str, str],
+                     stats: SiteBuildStats) -> List[str]:
+        """生成一个群的页面，返回该群的所有页面路径"""
+        links = sorted(links, key=lambda link: link.get("created_at", ""), reverse=True)
+        group_dir = f"groups/{slugify(key)}"
+        group_page = f"{group_dir}/index{self.ext}"
+        group_title = self._group_title(key)
+
+        by_tag: Dict[str, List[Dict]] = {}
+        for link in links:
+            for tag in link.get("tags", []):
+                by_tag.setdefault(tag, []).append(link)
+        tags = sorted(by_tag, key=lambda tag: (-len(by_tag[tag]), tag))
+        tag_pages = {tag: f"{group_dir}/tags/{slugify(tag)}{self.ext}" for tag in tags}
+
+        def page_digest(kind: str, title: str, page_links: List[Dict], extra: Iterable[str] = ()) -> str:
+            return _digest("\n".join([str(SITE_VERSION), kind, title, *extra,
+                                      *(digests[link["id"]] for link in page_links)]))
+
+        # 群页面：标签导航 + 所有链接
+        nav = [("首页", f"../../index{self.ext}")] + [
+            (f"{tag} ({len(by_tag[tag])})", f"tags/{slugify(tag)}{self.ext}") for tag in tags]
+        self._write_page(
+            group_page,
+            page_digest("group", group_title, links, (name for name, _ in nav)),
+            lambda: self._render_page(group_title, (self._render_link(link, digests[link["id"]]) for link in links), nav),
+            stats,
+        )
+
+        # 标签页面
+        for tag, tag_links in by_tag.items():
+            title = f"{group_title} · {tag}"
+            tag_nav = [("首页", f"../../../index{self.ext}"), (group_title, f"../index{self.ext}")]
+            self._write_page(
+                tag_pages[tag],
+                page_digest("tag", title, tag_links),
+                lambda title=title, tag_links=tag_links, tag_nav=tag_nav: self._render_page(
+                    title, (self._render_link(link, digests[link["id"]]) for link in tag_links), tag_nav),
+                stats,
+            )
+
+        self.manifest["groups"][key] = {"count": len(links), "pages": [group_page, *tag_pages.values()]}
+        return [group_page, *tag_pages.values()]
+
+    def build(self, shards: ShardManager, force: bool = False) -> SiteBuildStats:
+        """生成（或增量更新）整个网站
+
+        Args:
+            force: 为 True 时忽略内存中的分片状态，重新计算所有群（页面哈希未变时仍不会重写文件）
+        """
+        stats = SiteBuildStats()
+        keys = shards.keys()
+        manifest_before = json.dumps(self.manifest, sort_keys=True)
+        seen: Set[str] = set()  # 当前各群中链接的哈希
+
+        for key in keys:
+            state = self._shard_state(shards, key)
+            if not force and self._shard_states.get(key) == state and key in self.manifest["groups"]:
+                stats.groups_skipped += 1
+                cached = self._digest_cache.get(key)
+                if cached is not None:
+                    seen.update(cached[2].values())
+                continue
+            old_pages = set(self.manifest["groups"].get(key, {}).get("pages", []))
+            links = list(shards.peek_links(key))
+            digests = self._link_digests(shards, key, links)
+            seen.update(digests.values())
+            new_pages = set(self._build_group(key, links, digests, stats))
+            for path in old_pages - new_pages:
+                self._remove_page(path, stats)
+            self._shard_states[key] = state
+            stats.groups_built += 1
+
+        # 已不存在的群
+        for key in set(self.manifest["groups"]) - set(keys):
+            for path in self.manifest["groups"].pop(key).get("pages", []):
+                self._remove_page(path, stats)
+            self._shard_states.pop(key, None)
+            self._digest_cache.pop(key, None)
+
+        # 首页只依赖各群的名称和链接数
+        groups = [(key, self.manifest["groups"][key]["count"]) for key in keys if key in self.manifest["groups"]]
+        index_digest = _digest(json.dumps([SITE_VERSION, self.site_title, groups]))
+        self._write_page(
+            f"index{self.ext}",
+            index_digest,
+            lambda: self._render_page(self.site_title, (
+                f"- [{self._group_title(key)}](groups/{slugify(key)}/index{self.ext})（{count} 个链接）"
+                if self.fmt == "markdown" else
+                f'<li><a href="groups/{html.escape(slugify(key))}/index{self.ext}">'
+                f'{html.escape(self._group_title(key))}</a>（{count} 个链接）</li>'
+                for key, count in groups), []),
+            stats,
+        )
+
+        # 渲染缓存只保留当前仍在使用的链接（跳过的群沿用上次的哈希），链接修改前的旧结果随之丢弃
+        self._fragments = {digest: fragment for digest, fragment in self._fragments.items() if digest in seen}
+
+        if json.dumps(self.manifest, sort_keys=True) != manifest_before:
+            self._save_manifest()
+        return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口，直接读取分片文件"""
+    parser = argparse.ArgumentParser(prog="python -m plugins.LinkManager.sitegen", description="生成链接分享网站")
+    parser.add_argument("--dir", default="data/links", help="分片目录")
+    parser.add_argument("-o", "--output", default="data/site", help="输出目录")
+    parser.add_argument("--format", choices=list(FORMATS), default="markdown", help="页面格式")
+    parser.add_argument("--force", action="store_true", help="重新计算所有群")
+    args = parser.parse_args(argv)
+
+    generator = SiteGenerator(args.output, args.format)
+    print(generator.build(ShardManager(args.dir), force=args.force))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
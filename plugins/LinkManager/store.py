@@ -0,0 +1,188 @@
+import os
+import json
+import uuid
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from .urls import canonicalize_url
+
+
+def new_link_id() -> str:
+    """生成链接的唯一编号"""
+    return uuid.uuid4().hex
+
+
+def fold_duplicate_links(links: List[Dict]) -> Tuple[List[Dict], int]:
+    """把同一群内规范化 URL 相同的链接合并到最早添加的那条记录中
+
+    Returns:
+        (合并后的链接列表, 被合并掉的链接数)
+    """
+    kept: Dict[Tuple[Optional[str], str], Dict] = {}
+    result = []
+    for link in links:
+        key = (link.get("group_id"), canonicalize_url(link.get("url", "")))
+        first = kept.get(key)
+        if first is None:
+            kept[key] = link
+            result.append(link)
+            continue
+        merge_link(first, link)
+    return result, len(links) - len(result)
+
+
+def merge_link(target: Dict, source: Dict):
+    """把 source 的描述和标签合并到 target 中（相同的描述只保留一份）"""
+    descriptions = target.setdefault("descriptions", [])
+    for desc in source.get("descriptions", []):
+        if desc not in descriptions:
+            descriptions.append(desc)
+    if source.get("tags"):
+        target["tags"] = sorted(set(target.get("tags", [])) | set(source["tags"]))
+
+
+class LinkStore:
+    """链接数据的内存存储
+
+    启动时从文件加载一次，之后所有读取都直接走内存；
+    修改后调用 mark_dirty()，在 flush_delay 秒内的多次修改会合并为一次后台写入。
+    写入采用"临时文件 + fsync + 原子重命名"，进程中途崩溃也不会留下半截文件。
+    指定 schedule_path 时，每次写入后再写一份 {链接id: next_check} 的检查时间索引，
+    启动时只需读取这个小文件就能安排检查。
+    """
+
+    def __init__(self, path: str, flush_delay: float = 2.0, schedule_path: Optional[str] = None):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.schedule_path = schedule_path
+        self.links: List[Dict] = []
+        self._dirty = False
+        self.revision = 0  # 每次 mark_dirty 加一，供其他模块判断数据是否变化
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+
+    def load(self) -> List[Dict]:
+        """从文件加载链接数据（仅在启动时调用一次）"""
+        try:
+            with open(self.path, encoding="utf-8", mode="r") as f:
+                self.links = json.loads(f.read())
+        except FileNotFoundError:
+            self.links = []
+        except json.JSONDecodeError as e:
+            # 保留损坏的文件以便人工恢复，避免下次落盘把它覆盖掉
+            corrupt_path = f"{self.path}.corrupt"
+            print(f"链接数据文件损坏，已另存为 {corrupt_path}: {e}")
+            os.replace(self.path, corrupt_path)
+            self.links = []
+
+        # 旧数据没有编号，补上后写回
+        for link in self.links:
+            if not link.get("id"):
+                link["id"] = new_link_id()
+                self._dirty = True
+
+        # 合并旧数据中只是写法不同的重复链接
+        self.links, merged = fold_duplicate_links(self.links)
+        if merged:
+            print(f"已合并 {merged} 条重复链接")
+            self._dirty = True
+
+        self.flush_now()
+        return self.links
+
+    def is_clean(self) -> bool:
+        """没有未落盘的修改，也没有正在进行的写入"""
+        return not self._dirty and not self._write_lock.locked()
+
+    def mark_dirty(self):
+        """标记数据已修改，并安排一次延迟落盘"""
+        self._dirty = True
+        self.revision += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环（例如命令行工具），直接同步写入
+            self.flush_now()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        """等待一段时间收集更多修改后再写入"""
+        # 写入过程中产生的新修改会让 _dirty 重新置位，由这里的循环继续处理
+        while self._dirty:
+            await asyncio.sleep(self.flush_delay)
+            await self.flush()
+
+    def _serialize(self) -> str:
+        return json.dumps(self.links, ensure_ascii=False)
+
+    def _serialize_schedule(self) -> Optional[str]:
+        if self.schedule_path is None:
+            return None
+        return json.dumps({link["id"]: link.get("next_check") for link in self.links})
+
+    @staticmethod
+    def _replace_file(path: str, payload: str):
+        """先写临时文件再重命名，保证目标文件始终完整"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, encoding="utf-8", mode="w") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _write_atomic(self, payload: str, schedule: Optional[str] = None):
+        self._replace_file(self.path, payload)
+        # 索引在数据之后写入：中途崩溃时索引比数据旧，读取方据此判断它已失效
+        if schedule is not None:
+            self._replace_file(self.schedule_path, schedule)
+
+    async def flush(self):
+        """将内存中的数据写入文件（序列化在事件循环中完成，磁盘IO放到线程池）"""
+        if not self._dirty:
+            return
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            payload = self._serialize()
+            schedule = self._serialize_schedule()
+            future = asyncio.get_running_loop().run_in_executor(None, self._write_atomic, payload, schedule)
+            try:
+                try:
+                    await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # 被取消时也要等本次写入结束，避免与下一次写入争用临时文件
+                    await future
+                    raise
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._dirty = True
+                print(f"保存链接数据失败: {e}")
+
+    def flush_now(self):
+        """同步写入，用于没有事件循环的场景"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            self._write_atomic(self._serialize(), self._serialize_schedule())
+        except Exception as e:
+            self._dirty = True
+            print(f"保存链接数据失败: {e}")
+
+    async def close(self):
+        """取消等待中的延迟写入并立即落盘"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
@@ -0,0 +1,67 @@
+import heapq
+from typing import Dict, List, Set, Tuple
+
+
+class TagIndex:
+    """标签 -> 链接id 的倒排表
+
+    每个分片（即每个群）一份，倒排表的长度就是该标签在群内的链接数（分面计数）。
+    链接的标签变化后调用 add() 增量更新。
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Set[str]] = {}
+        self._link_tags: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def build(self, links: List[Dict]):
+        for link in links:
+            self.add(link)
+
+    def add(self, link: Dict):
+        """添加或更新一条链接的标签"""
+        link_id = link["id"]
+        new_tags = set(link.get("tags", []))
+        old_tags = self._link_tags.get(link_id, set())
+        for tag in old_tags - new_tags:
+            self._discard(tag, link_id)
+        for tag in new_tags - old_tags:
+            self.postings.setdefault(tag, set()).add(link_id)
+        self._link_tags[link_id] = new_tags
+
+    def remove(self, link_id: str):
+        for tag in self._link_tags.pop(link_id, set()):
+            self._discard(tag, link_id)
+
+    def _discard(self, tag: str, link_id: str):
+        posting = self.postings.get(tag)
+        if posting is None:
+            return
+        posting.discard(link_id)
+        if not posting:
+            del self.postings[tag]
+
+    def count(self, tag: str) -> int:
+        return len(self.postings.get(tag, ()))
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """链接数最多的 n 个标签，结果为 (标签, 链接数)"""
+        return heapq.nsmallest(n, ((tag, len(ids)) for tag, ids in self.postings.items()),
+                               key=lambda item: (-item[1], item[0]))
+
+    def match(self, tags: List[str], match_any: bool = False) -> Set[str]:
+        """按标签筛选链接id：默认需同时包含所有标签（AND），match_any 为 True 时包含任一标签即可（OR）"""
+        postings = [self.postings.get(tag, set()) for tag in tags]
+        if not postings:
+            return set()
+        if match_any:
+            return set().union(*postings)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result.intersection_update(posting)
+            if not result:
+                break
+        return result
@@ -0,0 +1,249 @@
+"""链接数据的批量导入导出
+
+导出和导入都是生成器流水线：逐个分片读取 -> 过滤 -> 逐行写出，或逐行读取 -> 分批合并，
+任何时候内存中只有一个分片（导出）或一批记录（导入）。
+
+也可以在机器人未运行时通过命令行使用：
+    python -m plugins.LinkManager.transfer export -o links.jsonl [-g 群号] [-t 标签] [--since 2024-01-01]
+    python -m plugins.LinkManager.transfer import links.csv [-g 群号]
+"""
+import os
+import csv
+import sys
+import json
+import argparse
+from datetime import datetime
+from itertools import islice
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from .store import new_link_id, merge_link
+from .shards import LinkShard, ShardManager, PRIVATE_SHARD, shard_key
+from .urls import canonicalize_url
+
+FORMATS = ("jsonl", "csv")
+
+# CSV 的列；标签用逗号连接，描述保存为 JSON 数组
+CSV_FIELDS = ["url", "group_id", "creator_id", "creator_name", "created_at", "tags", "title", "descriptions"]
+
+
+def iter_links(shards: ShardManager, group_id: Optional[str] = None) -> Iterator[Dict]:
+    """逐个分片读取链接，未加载的分片只临时读取，不会留在内存"""
+    keys = [shard_key(group_id)] if group_id is not None else shards.keys()
+    for key in keys:
+        yield from shards.peek_links(key)
+
+
+def filter_links(links: Iterable[Dict], tags: Optional[List[str]] = None,
+                 since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict]:
+    """按标签（需同时包含）和添加时间筛选链接
+
+    Args:
+        since: 起始日期（含），如 "2024-01-01"
+        until: 结束日期（含），如 "2024-01-31"
+    """
+    required = set(tags or [])
+    for link in links:
+        created_at = link.get("created_at", "")
+        if since and created_at < since:
+            continue
+        # 按 until 的精度比较，"2024-01-31" 包含当天的所有时间
+        if until and created_at[:len(until)] > until:
+            continue
+        if required and not required.issubset(link.get("tags", [])):
+            continue
+        yield link
+
+
+def write_jsonl(links: Iterable[Dict], fp: IO[str]) -> int:
+    """每行写出一条链接，返回写出的条数"""
+    count = 0
+    for link in links:
+        fp.write(json.dumps(link, ensure_ascii=False))
+        fp.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(links: Iterable[Dict], fp: IO[str]) -> int:
+    """按 CSV_FIELDS 写出链接，返回写出的条数"""
+    writer = csv.DictWriter(fp, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    count = 0
+    for link in links:
+        writer.writerow({
+            "url": link["url"],
+            "group_id": link.get("group_id") or "",
+            "creator_id": link.get("creator_id", ""),
+            "creator_name": link.get("creator_name", ""),
+            "created_at": link.get("created_at", ""),
+            "tags": ",".join(link.get("tags", [])),
+            "title": link.get("meta", {}).get("title", ""),
+            "descriptions": json.dumps(link.get("descriptions", []), ensure_ascii=False),
+        })
+        count += 1
+    return count
+
+
+def read_jsonl(fp: IO[str]) -> Iterator[Dict]:
+    for line_no, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"第 {line_no} 行不是有效的 JSON，已跳过: {e}")
+
+
+def read_csv(fp: IO[str]) -> Iterator[Dict]:
+    for row in csv.DictReader(fp):
+        try:
+            descriptions = json.loads(row.get("descriptions") or "[]")
+        except json.JSONDecodeError:
+            # 手工编辑的 CSV 中描述可能是纯文本
+            descriptions = [{"content": row["descriptions"], "user_id": row.get("creator_id", ""),
+                             "username": row.get("creator_name", ""), "timestamp": row.get("created_at", "")}]
+        yield {
+            "url": row.get("url", ""),
+            "group_id": row.get("group_id") or None,
+            "creator_id": row.get("creator_id", ""),
+            "creator_name": row.get("creator_name", ""),
+            "created_at": row.get("created_at", ""),
+            "tags": [tag.strip() for tag in (row.get("tags") or "").split(",") if tag.strip()],
+            "descriptions": descriptions,
+        }
+
+
+def format_of(path: str, default: str = "jsonl") -> str:
+    """根据文件扩展名判断格式"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    return extension if extension in FORMATS else default
+
+
+def export_links(links: Iterable[Dict], path: str, fmt: Optional[str] = None) -> int:
+    """把链接写到文件（先写临时文件再重命名），返回写出的条数"""
+    fmt = fmt or format_of(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, encoding="utf-8", mode="w", newline="") as f:
+        count = write_csv(links, f) if fmt == "csv" else write_jsonl(links, f)
+    os.replace(temp_path, path)
+    return count
+
+
+def read_records(path: str, fmt: Optional[str] = None) -> Iterator[Dict]:
+    """逐条读取导入文件中的记录"""
+    fmt = fmt or format_of(path)
+    with open(path, encoding="utf-8", mode="r", newline="") as f:
+        yield from (read_csv(f) if fmt == "csv" else read_jsonl(f))
+
+
+def batched(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _new_link(record: Dict, group_id: Optional[str]) -> Dict:
+    link = {
+        "id": new_link_id(),
+        "url": record["url"].strip(),
+        "group_id": group_id,
+        "creator_id": record.get("creator_id", ""),
+        "creator_name": record.get("creator_name", ""),
+        "created_at": record.get("created_at") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "tags": sorted(set(record.get("tags", []))),
+        "descriptions": list(record.get("descriptions", [])),
+    }
+    if record.get("meta"):
+        link["meta"] = record["meta"]
+    return link
+
+
+def import_batches(shards: ShardManager, records: Iterable[Dict], batch_size: int = 1000,
+                   group_id: Optional[str] = None) -> Iterator[Tuple[Dict[str, LinkShard], List[Tuple[str, Dict]], int, int]]:
+    """分批把记录合并到分片中，与 add_link 一样按规范化 URL 去重
+
+    每处理完一批 yield 一次 (本批修改过的分片, 本批新增的 (分片名, 链接), 合并数, 跳过数)，
+    由调用方决定何时落盘（标记修改、安排检查等），整批只需落盘一次。
+
+    Args:
+        group_id: 指定时所有记录导入到这个群，否则使用记录自身的 group_id；为 "private" 时导入为私聊链接
+    """
+    for batch in batched(records, batch_size):
+        touched: Dict[str, LinkShard] = {}
+        added: List[Tuple[str, Dict]] = []
+        merged = skipped = 0
+        for record in batch:
+            url = (record.get("url") or "").strip()
+            if not url.startswith(("http://", "https://")):
+                skipped += 1
+                continue
+            target_group = group_id if group_id is not None else record.get("group_id")
+            # 私聊链接的 group_id 为 None，"private" 只是分片名
+            target_group = str(target_group) if target_group not in (None, PRIVATE_SHARD) else None
+            shard = shards.get(target_group)
+            canonical = canonicalize_url(url)
+            existing = shard.url_index.get(canonical)
+            if existing is not None:
+                merge_link(existing, record)
+                link = existing
+                merged += 1
+            else:
+                link = _new_link(record, target_group)
+                shard.append(link, canonical)
+                added.append((shard.key, link))
+            shard.reindex(link)
+            touched[shard.key] = shard
+        yield touched, added, merged, skipped
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口，直接读写分片文件，使用前请先停止机器人"""
+    parser = argparse.ArgumentParser(prog="python -m plugins.LinkManager.transfer", description="链接数据导入导出")
+    parser.add_argument("--dir", default="data/links", help="分片目录")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="导出链接")
+    export_parser.add_argument("-o", "--output", required=True, help="输出文件，扩展名为 .csv 时导出 CSV，否则为 JSONL")
+    export_parser.add_argument("-g", "--group", help="只导出这个群的链接（私聊链接为 private）")
+    export_parser.add_argument("-t", "--tags", default="", help="只导出同时包含这些标签的链接，用逗号分隔")
+    export_parser.add_argument("--since", help="起始日期（含），如 2024-01-01")
+    export_parser.add_argument("--until", help="结束日期（含），如 2024-01-31")
+
+    import_parser = commands.add_parser("import", help="导入链接")
+    import_parser.add_argument("input", help="输入文件（.csv 或 .jsonl）")
+    import_parser.add_argument("-g", "--group", help="导入到这个群（私聊链接为 private），默认使用记录中的 group_id")
+    import_parser.add_argument("--batch", type=int, default=1000, help="每批处理的记录数")
+
+    args = parser.parse_args(argv)
+    shards = ShardManager(args.dir)
+
+    if args.command == "export":
+        tags = [tag.strip() for tag in args.tags.split(",") if tag.strip()]
+        links = filter_links(iter_links(shards, args.group), tags, args.since, args.until)
+        count = export_links(links, args.output)
+        print(f"已导出 {count} 条链接到 {args.output}")
+        return
+
+    touched: Dict[str, LinkShard] = {}
+    added = merged = skipped = 0
+    for batch_touched, batch_added, batch_merged, batch_skipped in import_batches(
+            shards, read_records(args.input), args.batch, args.group):
+        touched.update(batch_touched)
+        added += len(batch_added)
+        merged += batch_merged
+        skipped += batch_skipped
+    # 没有事件循环时 mark_dirty 直接同步写入，每个分片只写一次
+    for shard in touched.values():
+        shard.mark_dirty()
+    print(f"导入完成：新增 {added} 条，合并 {merged} 条，跳过 {skipped} 条")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# 不影响页面内容的跟踪参数，规范化时去掉
+_TRACKING_PARAMS = {
+    "fbclid", "gclid", "yclid", "msclkid", "mc_cid", "mc_eid",
+    "spm_id_from", "vd_source", "share_source", "share_medium", "share_from",
+}
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name.startswith("utm_") or name in _TRACKING_PARAMS
+
+
+def canonicalize_url(url: str) -> str:
+    """把 URL 规范化，用于判断两个链接是否指向同一资源
+
+    - 协议和域名转小写，http 统一为 https，去掉默认端口
+    - 去掉片段（#...）和 utm_* 等跟踪参数，其余参数按名称排序
+    - 去掉路径末尾的斜杠
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if port is not None and port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    if scheme == "http":
+        scheme = "https"
+
+    path = parts.path.rstrip("/")
+
+    query = urlencode(sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(name)
+    ))
+
+    return urlunsplit((scheme, host, path, query, ""))